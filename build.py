@@ -4,6 +4,7 @@
 import argparse
 import glob
 import io
+import json
 import os
 import platform
 import subprocess
@@ -46,10 +47,20 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--gdb_compatible', action='store_true')
 parser.add_argument("--dry", action="store_true")
 parser.add_argument("--ci", action="store_true")
+# Run the Python build steps in a persistent server to only pay for interpreter startup and
+# imports once per build
+parser.add_argument('--daemon', default=os.name == 'posix', action=argparse.BooleanOptionalAction)
+# Per-archive codecs and Yaz0 levels written by plan_compression.py
+parser.add_argument('--compression-plan', default=os.path.join('build', 'compression_plan.json'))
 for feature in features:
     parser.add_argument(f'--{feature}', default=True, action=argparse.BooleanOptionalAction)
 args = parser.parse_args(our_argv)
 
+compression_plan = {}
+if os.path.exists(args.compression_plan):
+    with open(args.compression_plan, 'r') as plan_file:
+        compression_plan = json.load(plan_file)
+
 out_buf = io.StringIO()
 n = Writer(out_buf)
 
@@ -60,20 +71,31 @@ n.variable('builddir', 'build')
 n.variable('outdir', 'out')
 n.newline()
 
+if args.daemon:
+    n.variable('python', ' '.join([
+        sys.executable,
+        '-S',
+        os.path.join('tools', 'daemon', 'client.py'),
+        os.path.join('$builddir', 'daemon.sock'),
+    ]))
+else:
+    n.variable('python', sys.executable)
+n.newline()
+
 n.variable('merge', os.path.join('.', 'merge.py'))
 n.variable('wuj5', os.path.join('vendor', 'wuj5', 'wuj5.py'))
 n.newline()
 
 n.rule(
     'merge',
-    command = f'{sys.executable} $merge $in -o $out',
-    description = 'MERGE $out',
+    command = '$python $merge --strict-json $batches',
+    description = 'MERGE $bmgs',
 )
 n.newline()
 
 n.rule(
     'wuj5',
-    command = f'{sys.executable} $wuj5 encode $in -o $out',
+    command = '$python $wuj5 encode $in -o $out --strict-json',
     description = 'WUJ5 $out',
 )
 n.newline()
@@ -85,10 +107,13 @@ n.rule(
 )
 n.newline()
 
+# Ninja already runs the archives in parallel, each of them only gets a couple of processes for
+# the members that aren't cached.
 n.rule(
     'arc',
-    command = f'{sys.executable} $wuj5 encode $arcin -o $out --retained $in $args',
+    command = '$python $wuj5 encode $arcin -o $out --retained $in --dedup --incremental --strict-json -j 2 $args',
     description = 'ARC $out',
+    restat = True,
 )
 n.newline()
 
@@ -838,6 +863,7 @@ for language in LANGUAGES:
         os.path.join('message', f'Menu_{language}.bmg.json5'),
     ]
 asset_out_files = {target: [] for target in asset_in_files}
+bmg_in_files = {}
 for target in asset_in_files:
     for in_file in asset_in_files[target]:
         base, ext = os.path.splitext(in_file)
@@ -856,22 +882,16 @@ for target in asset_in_files:
         basebase, baseext = os.path.splitext(base)
         out_files = [out_file for out_files in asset_out_files.values() for out_file in out_files]
         if baseext == '.bmg':
-            merged_file = os.path.join('$builddir', 'merged', in_file)
+            # Merged and packed together below
             if out_file not in out_files:
-                n.build(
-                    merged_file,
-                    'merge',
-                    [
-                        os.path.join('assets', in_file),
-                        os.path.join('assets', basebase.rsplit('_', 1)[0] + 'SP_U.bmg.json5'),
-                        os.path.join('assets', basebase.replace('_', 'SP_') + '.bmg.json5'),
-                    ],
-                    implicit = '$merge',
-                )
-                in_file = merged_file
+                bmg_in_files[out_file] = [
+                    os.path.join('assets', in_file),
+                    os.path.join('assets', basebase.rsplit('_', 1)[0] + 'SP_U.bmg.json5'),
+                    os.path.join('assets', basebase.replace('_', 'SP_') + '.bmg.json5'),
+                ]
         else:
             in_file = os.path.join('assets', in_file)
-        if out_file not in out_files:
+        if out_file not in out_files and baseext != '.bmg':
             rule = {
                 '.bin': 'cp',
                 '.breff': 'cp',
@@ -891,6 +911,22 @@ for target in asset_in_files:
         asset_out_files[target] += [out_file]
 n.newline()
 
+# All the languages share the fallback messages, so they are merged in a single process which
+# parses every source once and packs the bmg files directly.
+n.build(
+    list(bmg_in_files),
+    'merge',
+    sorted({in_file for in_files in bmg_in_files.values() for in_file in in_files}),
+    implicit = '$merge',
+    variables = {
+        'batches': ' '.join(
+            f'--batch {out_file} {" ".join(in_files)}' for out_file, in_files in bmg_in_files.items()
+        ),
+        'bmgs': f'{len(bmg_in_files)} bmg files',
+    },
+)
+n.newline()
+
 renamed = {}
 for language in LANGUAGES:
     renamed[f'jugemu_lap_{language}.brres'] = 'jugemu_lap.brres'
@@ -915,6 +951,11 @@ for target in asset_out_files:
         if out_file in renamed:
             target_renamed[out_file] = renamed[out_file]
     target_renamed = ' '.join([f'--renamed {src} {dst}' for src, dst in target_renamed.items()])
+    entry = compression_plan.get(target.replace(os.sep, '/'))
+    if entry is not None:
+        target_renamed += f' --codec {entry["codec"]}'
+        if 'level' in entry:
+            target_renamed += f' --level {entry["level"]}'
     n.build(
         os.path.join('$builddir', 'contents.arc.d', target),
         'arc',
@@ -944,14 +985,16 @@ n.newline()
 
 n.rule(
     'write',
-    command = f'{sys.executable} $write "$content" $out',
+    command = '$python $write "$content" $out',
     description = 'WRITE $out',
 )
 
 n.rule(
     'nanopb',
-    command = f'{sys.executable} $nanopb $in -I protobuf -L "#include <vendor/nanopb/%s>" -D build/protobuf -q',
-    description = 'NANOPB $out',
+    command = f'{sys.executable} $nanopb $in -I protobuf -L "#include <vendor/nanopb/%s>" -D build/protobuf -q ' +
+            '--descriptor-cache build/protobuf/descriptors',
+    description = 'NANOPB $in',
+    restat = True,
 )
 n.newline()
 
@@ -1097,15 +1140,15 @@ n.newline()
 
 n.rule(
     'postprocess',
-    command = f'{sys.executable} $postprocess $region $in $out',
+    command = '$python $postprocess $region $in $out',
     description = 'POSTPROCESS $out'
 )
 n.newline()
 
 n.rule(
     'port',
-    command = f'{sys.executable} $port $region $in $out' + (' --base' if args.gdb_compatible else ''),
-    description = 'PORT $out'
+    command = '$python $port --all-regions $in $scripts' + (' --base' if args.gdb_compatible else ''),
+    description = 'PORT $scripts'
 )
 n.newline()
 
@@ -1116,30 +1159,39 @@ n.rule(
 )
 n.newline()
 
+# One cache per map, since the maps of all regions and profiles are generated concurrently.
 n.rule(
     'generate_symbol_map',
-    command = f'{sys.executable} $generate_symbol_map $in $out',
+    command = '$python $generate_symbol_map $in $out --format binary --demangle-cache $out.demangle_cache.json',
     description = 'SMAP $out',
 )
 n.newline()
 
+# Picked with `lzmac.py --report`: all of these only trade compression time, and the smaller lc + lp
+# also shrink the probability tables that the console decoders have to initialize.
+lzma_settings = {
+    # 32-bit aligned data: PowerPC code and the binary symbol maps
+    'code': '--preset 9 --extreme --lc 0 --lp 2 --pb 2',
+    'banner': '--preset 9 --extreme --lc 0 --lp 3 --pb 0',
+}
+
 n.rule(
     'lzmac',
-    command = f'{sys.executable} $lzmac $in $out',
+    command = '$python $lzmac $in -o $out $lzmaflags',
     description = 'LZMA $out',
 )
 n.newline()
 
 n.rule(
     'version',
-    command = f'{sys.executable} $version $type $out',
+    command = '$python $version $type $out',
     description = 'VERSION $out',
 )
 n.newline()
 
 n.rule(
     'elf2dol',
-    command = f'{sys.executable} $elf2dol $in $out',
+    command = '$python $elf2dol $in $out',
     description = 'DOL $out',
 )
 n.newline()
@@ -1178,22 +1230,22 @@ protobuf_proto_files = [
 ]
 protobuf_h_files = []
 protobuf_c_files = []
+protobuf_options_files = []
 for proto_file in protobuf_proto_files:
     base, _ = os.path.splitext(proto_file)
-    options_file = base + '.options'
-    h_file = os.path.join('$builddir', base + '.pb.h')
-    c_file = os.path.join('$builddir', base + '.pb.c')
-    protobuf_h_files += [h_file]
-    protobuf_c_files += [c_file]
-    n.build(
-        [
-            h_file,
-            c_file,
-        ],
-        'nanopb',
-        proto_file,
-        implicit = options_file,
-    )
+    protobuf_options_files += [base + '.options']
+    protobuf_h_files += [os.path.join('$builddir', base + '.pb.h')]
+    protobuf_c_files += [os.path.join('$builddir', base + '.pb.c')]
+# A single generator run resolves the shared imports once, and only rewrites the files that changed.
+n.build(
+    [
+        *protobuf_h_files,
+        *protobuf_c_files,
+    ],
+    'nanopb',
+    protobuf_proto_files,
+    implicit = protobuf_options_files,
+)
 n.newline()
 
 code_in_files = {
@@ -1339,19 +1391,18 @@ for profile in ['DEBUG', 'RELEASE']:
     )
     n.newline()
 
-for region in ['P', 'E', 'J', 'K']:
-    for profile in ['DEBUG', 'RELEASE']:
-        suffix = 'D' if profile == 'DEBUG' else ''
-        n.build(
-            os.path.join('$builddir', 'scripts', f'RMC{region}{suffix}.ld'),
-            'port',
-            os.path.join('$builddir', 'bin', f'symbols{suffix}.txt'),
-            variables = {
-                'region': region,
-            },
-            implicit = '$port',
-        )
-        n.newline()
+for profile in ['DEBUG', 'RELEASE']:
+    suffix = 'D' if profile == 'DEBUG' else ''
+    n.build(
+        [os.path.join('$builddir', 'scripts', f'RMC{region}{suffix}.ld') for region in ['P', 'E', 'J', 'K']],
+        'port',
+        os.path.join('$builddir', 'bin', f'symbols{suffix}.txt'),
+        variables = {
+            'scripts': os.path.join('$builddir', 'scripts', f'RMC{{region}}{suffix}.ld'),
+        },
+        implicit = '$port',
+    )
+    n.newline()
 
 for profile in ['DEBUG', 'RELEASE']:
     suffix = 'D' if profile == 'DEBUG' else ''
@@ -1451,22 +1502,28 @@ for region in ['P', 'E', 'J', 'K']:
         )
         n.newline()
 
+# All the maps change together whenever the payload does, so they are compressed in one batch.
+smap_in_files = []
+smap_out_files = []
 for region in ['P', 'E', 'J', 'K']:
     for profile in ['DEBUG', 'RELEASE']:
         suffix = 'D' if profile == 'DEBUG' else ''
-        in_file = os.path.join('$builddir', 'bin', f'payload{region}{suffix}.SMAP')
-        out_file = os.path.join(
+        smap_in_files += [os.path.join('$builddir', 'bin', f'payload{region}{suffix}.SMAP')]
+        smap_out_files += [os.path.join(
             '$builddir',
             'contents.arc.d',
             'bin',
             f'payload{region}{suffix}.SMAP.lzma'
-        )
-        n.build(
-            out_file,
-            'lzmac',
-            in_file,
-        )
-        n.newline()
+        )]
+n.build(
+    smap_out_files,
+    'lzmac',
+    smap_in_files,
+    variables = {
+        'lzmaflags': lzma_settings['code'],
+    },
+)
+n.newline()
 
 for profile in ['DEBUG', 'RELEASE']:
     suffix = 'D' if profile == 'DEBUG' else ''
@@ -1474,6 +1531,9 @@ for profile in ['DEBUG', 'RELEASE']:
         os.path.join('$builddir', 'contents.arc.d', 'bin', f'loader{suffix}.bin.lzma'),
         'lzmac',
         os.path.join('$builddir', 'bin', f'loader{suffix}.bin'),
+        variables = {
+            'lzmaflags': lzma_settings['code'],
+        },
     )
 
 for profile in ['DEBUG', 'TEST', 'RELEASE']:
@@ -1497,6 +1557,9 @@ n.build(
     os.path.join('$builddir', 'contents.arc.d', 'channel', 'opening.bnr.lzma'),
     'lzmac',
     'opening.bnr',
+    variables = {
+        'lzmaflags': lzma_settings['banner'],
+    },
 )
 
 n.build(
@@ -1527,6 +1590,9 @@ n.build(
     os.path.join('$builddir', 'contents.arc.d', 'channel', 'boot.dol.lzma'),
     'lzmac',
     os.path.join('$builddir', 'bin', 'stubC.dol'),
+    variables = {
+        'lzmaflags': lzma_settings['code'],
+    },
 )
 n.newline()
 
@@ -1673,6 +1739,11 @@ except KeyboardInterrupt:
     returncode = 130 # 128 + SIGINT
 else:
     returncode = proc.returncode
+    # Not done by each wuj5 run, since they share the cache with the ones running in parallel.
+    subprocess.run(
+        (sys.executable, os.path.join('vendor', 'wuj5', 'wuj5.py'), 'cache', 'prune'),
+        stdout=subprocess.DEVNULL,
+    )
 
 os.remove(out_file.name)
 sys.exit(returncode)
@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+import mmap
+import struct
+import sys
+
+
+PT_LOAD = 0x1
+
+PF_X = 0x1
+PF_W = 0x2
+PF_R = 0x4
+
+SHT_SYMTAB = 0x2
+
+SHN_UNDEF = 0x0
+
+STT_NOTYPE = 0x0
+STT_OBJECT = 0x1
+STT_FUNC = 0x2
+STT_SECTION = 0x3
+STT_FILE = 0x4
+
+@dataclass
+class Segment:
+    type: int
+    flags: int
+    offset: int
+    vaddr: int
+    filesz: int
+    memsz: int
+
+@dataclass
+class Section:
+    name: str
+    type: int
+    offset: int
+    size: int
+    link: int
+    entsize: int
+
+@dataclass
+class Symbol:
+    name: str
+    value: int
+    size: int
+    type: int
+    bind: int
+    shndx: int
+
+# Field layouts for each ELF class, the byte order is prepended when reading.
+FORMATS = {
+    1: {
+        'header': 'HHIIIIIHHHHHH',
+        'segment': 'IIIIIIII',
+        'section': 'IIIIIIIIII',
+        'symbol': 'IIIBBH',
+    },
+    2: {
+        'header': 'HHIQQQIHHHHHH',
+        'segment': 'IIQQQQQQ',
+        'section': 'IIQQQQIIQQ',
+        'symbol': 'IBBHQQ',
+    },
+}
+
+class Elf:
+    def __init__(self, path):
+        with open(path, 'rb') as elf_file:
+            self.data = mmap.mmap(elf_file.fileno(), 0, access = mmap.ACCESS_READ)
+        if self.data[:0x4] != b'\x7fELF':
+            sys.exit(f'{path} is not an ELF file!')
+        self.elf_class = self.data[0x4]
+        if self.elf_class not in FORMATS:
+            sys.exit(f'{path} has an unknown ELF class {self.elf_class}!')
+        byte_order = {1: '<', 2: '>'}.get(self.data[0x5])
+        if byte_order is None:
+            sys.exit(f'{path} has an unknown ELF byte order {self.data[0x5]}!')
+        formats = {name: struct.Struct(byte_order + fmt) for name, fmt in FORMATS[self.elf_class].items()}
+        self.symbol_struct = formats['symbol']
+
+        (
+            self.type, self.machine, _, self.entry, phoff, shoff, _, _, phentsize, phnum, shentsize,
+            shnum, shstrndx,
+        ) = formats['header'].unpack_from(self.data, 0x10)
+
+        self.segments = []
+        for i in range(phnum):
+            fields = formats['segment'].unpack_from(self.data, phoff + i * phentsize)
+            if self.elf_class == 1:
+                p_type, offset, vaddr, _, filesz, memsz, flags, _ = fields
+            else:
+                p_type, flags, offset, vaddr, _, filesz, memsz, _ = fields
+            self.segments += [Segment(p_type, flags, offset, vaddr, filesz, memsz)]
+
+        raw_sections = []
+        for i in range(shnum):
+            name, sh_type, _, _, offset, size, link, _, _, entsize = formats['section'].unpack_from(
+                self.data, shoff + i * shentsize
+            )
+            raw_sections += [(name, sh_type, offset, size, link, entsize)]
+        self.sections = []
+        if raw_sections:
+            shstrtab_offset = raw_sections[shstrndx][2]
+            for name, sh_type, offset, size, link, entsize in raw_sections:
+                self.sections += [Section(self.get_string(shstrtab_offset + name), sh_type, offset,
+                                          size, link, entsize)]
+        self.symbols = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.data.close()
+
+    def get_string(self, offset):
+        return self.data[offset:self.data.find(b'\0', offset)].decode('utf-8')
+
+    def get_section_index(self, name):
+        return next((i for i, section in enumerate(self.sections) if section.name == name), None)
+
+    def get_segment_data(self, segment):
+        return self.data[segment.offset:segment.offset + segment.filesz]
+
+    def get_symbols(self):
+        # The symbol table is parsed on first use only, then kept.
+        if self.symbols is not None:
+            return self.symbols
+        self.symbols = []
+        symtab = next((section for section in self.sections if section.type == SHT_SYMTAB), None)
+        if symtab is None:
+            return self.symbols
+        strtab_offset = self.sections[symtab.link].offset
+        names = {}
+        for fields in self.symbol_struct.iter_unpack(self.data[symtab.offset:symtab.offset + symtab.size]):
+            if self.elf_class == 1:
+                name, value, size, info, _, shndx = fields
+            else:
+                name, info, _, shndx, value, size = fields
+            if name not in names:
+                names[name] = self.get_string(strtab_offset + name)
+            self.symbols += [Symbol(names[name], value, size, info & 0xf, info >> 4, shndx)]
+        return self.symbols
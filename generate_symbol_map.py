@@ -1,44 +1,99 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser
-from elftools.elf.elffile import ELFFile
-from itanium_demangler import parse
+import hashlib
+import importlib.util
+import json
+import os
 import re
+import tempfile
+
+from elf import Elf
+from smap import pack_smap
+
+# Equivalent to stripping everything from the first dot, then the _GLOBAL__sub_?_, patch_,
+# replaced_ and replacement_ prefixes in that order.
+symbol_name_pattern = re.compile(
+    r'(?:_GLOBAL__sub_[A-Z]_)?(?:patch_)?(?:replaced_)?(?:replacement_)?([^.]*)'
+)
+
+def get_demangler_version():
+    # The cache must not outlive the demangler that filled it, its source is cheaper to hash
+    # than importing it.
+    origin = importlib.util.find_spec('itanium_demangler').origin
+    with open(origin, 'rb') as demangler_file:
+        return hashlib.sha256(demangler_file.read()).hexdigest()
+
+def load_demangle_cache(cache_path, version):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('version') != version:
+        return {}
+    return cache.get('names', {})
+
+def store_demangle_cache(cache_path, version, names):
+    try:
+        cache_dir = os.path.dirname(cache_path) or '.'
+        os.makedirs(cache_dir, exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = cache_dir, prefix = '.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump({'version': version, 'names': names}, tmp_file, separators = (',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+def demangle(symbol_name):
+    # Only imported when the cache misses.
+    from itanium_demangler import parse
+
+    try:
+        demangled_symbol_name = parse(symbol_name)
+        if demangled_symbol_name:
+            return str(demangled_symbol_name)
+    except:
+        pass
+    return symbol_name
 
 argument_parser = ArgumentParser()
 argument_parser.add_argument('elf_file_path')
 argument_parser.add_argument('smap_file_path')
+argument_parser.add_argument('--demangle-cache', help = 'JSON file caching demangled names across runs')
+argument_parser.add_argument('--format', choices = ['text', 'binary'], default = 'text')
 args = argument_parser.parse_args()
 
-with open(args.elf_file_path, 'rb') as elf_file_stream:
-    symtab_section = ELFFile(elf_file_stream).get_section_by_name('.symtab')
-
-    bad_symbol_patterns = [
-        re.compile(r'\.(.*)$'),
-        re.compile(r'^_GLOBAL__sub_[A-Z]_'),
-        re.compile(r'^patch_'),
-        re.compile(r'^replaced_'),
-        re.compile(r'^replacement_'),
-    ]
+if args.demangle_cache is not None:
+    version = get_demangler_version()
+    cached_names = load_demangle_cache(args.demangle_cache, version)
+else:
+    cached_names = {}
+# Only the names of this ELF are stored back, so that removed symbols are dropped from the cache.
+demangled_names = {}
 
+with Elf(args.elf_file_path) as elf:
     dictionary = {}
-    for symbol in symtab_section.iter_symbols():
-        if (symbol.entry['st_value'] < 0x80000000):
+    for symbol in elf.get_symbols():
+        if (symbol.value < 0x80000000):
             continue
 
-        symbol_name = symbol.name
-        for bad_symbol_pattern in bad_symbol_patterns:
-            symbol_name = bad_symbol_pattern.sub('', symbol_name)
+        symbol_name = symbol_name_pattern.match(symbol.name).group(1)
+
+        demangled_symbol_name = cached_names.get(symbol_name)
+        if demangled_symbol_name is None:
+            demangled_symbol_name = demangle(symbol_name)
+        demangled_names[symbol_name] = demangled_symbol_name
 
-        try:
-            demangled_symbol_name = parse(symbol_name)
-            if demangled_symbol_name:
-                symbol_name = demangled_symbol_name
-        except:
-            pass
+        dictionary[symbol.value] = demangled_symbol_name
 
-        dictionary[symbol.entry['st_value']] = symbol_name
+if args.demangle_cache is not None and demangled_names != cached_names:
+    store_demangle_cache(args.demangle_cache, version, demangled_names)
 
-with open(args.smap_file_path, 'w', newline='\n') as smap_file_stream:
-    for item in sorted(dictionary.items()):
-        smap_file_stream.write(f"0x{item[0]:X} {item[1]}\n")
+if args.format == 'binary':
+    with open(args.smap_file_path, 'wb') as smap_file_stream:
+        smap_file_stream.write(pack_smap(dictionary.items()))
+else:
+    with open(args.smap_file_path, 'w', newline='\n') as smap_file_stream:
+        for item in sorted(dictionary.items()):
+            smap_file_stream.write(f"0x{item[0]:X} {item[1]}\n")
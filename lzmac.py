@@ -2,15 +2,90 @@
 
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 import lzma
+import os
+import sys
+import time
+
+
+CHUNK_SIZE = 0x100000
+
+def get_filters(preset, extreme, dict_size, lc, lp, pb):
+    lzma_filter = {
+        'id': lzma.FILTER_LZMA1,
+        'preset': preset | (lzma.PRESET_EXTREME if extreme else 0),
+    }
+    for key, val in [('dict_size', dict_size), ('lc', lc), ('lp', lp), ('pb', pb)]:
+        if val is not None:
+            lzma_filter[key] = val
+    return [lzma_filter]
+
+def compress(in_path, out_path, filters):
+    # The .lzma header can only store an unknown size when streaming, which both the stub and the
+    # payload decoders accept.
+    compressor = lzma.LZMACompressor(format = lzma.FORMAT_ALONE, filters = filters)
+    with open(in_path, 'rb') as in_file, open(out_path, 'wb') as out_file:
+        while True:
+            chunk = in_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            out_file.write(compressor.compress(chunk))
+        out_file.write(compressor.flush())
+
+def report(in_paths, presets, filters):
+    for in_path in in_paths:
+        with open(in_path, 'rb') as in_file:
+            in_data = in_file.read()
+        print(f'{in_path}: {len(in_data)} bytes')
+        for preset in presets:
+            preset_filters = [{**filters[0], 'preset': preset}]
+            start = time.perf_counter()
+            out_data = lzma.compress(in_data, format = lzma.FORMAT_ALONE, filters = preset_filters)
+            compress_time = time.perf_counter() - start
+            start = time.perf_counter()
+            lzma.decompress(out_data, format = lzma.FORMAT_ALONE)
+            decompress_time = time.perf_counter() - start
+            extreme = 'e' if preset & lzma.PRESET_EXTREME else ''
+            ratio = len(out_data) / max(len(in_data), 1)
+            print(
+                f'    {preset & ~lzma.PRESET_EXTREME}{extreme:1}: {len(out_data):>9} bytes '
+                f'({ratio:6.2%}), compress {compress_time * 1000:8.1f}ms, '
+                f'decompress {decompress_time * 1000:6.1f}ms'
+            )
 
 
 parser = ArgumentParser()
-parser.add_argument('in_path')
-parser.add_argument('out_path')
+parser.add_argument('inputs', nargs='+')
+parser.add_argument('-o', '--outputs', nargs='+')
+parser.add_argument('--preset', type=int, choices=range(10), default=lzma.PRESET_DEFAULT)
+parser.add_argument('--extreme', action='store_true')
+parser.add_argument('--dict-size', type=int)
+parser.add_argument('--lc', type=int, choices=range(5))
+parser.add_argument('--lp', type=int, choices=range(5))
+parser.add_argument('--pb', type=int, choices=range(5))
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+parser.add_argument('--report', action='store_true', help='Compare the presets on each input instead')
 args = parser.parse_args()
 
-with \
-    open(args.in_path, 'rb') as in_file, \
-    lzma.open(args.out_path, 'wb', format = lzma.FORMAT_ALONE) as out_file:
-    out_file.write(in_file.read())
+# Every preset uses lc=3 and lp=0.
+if (3 if args.lc is None else args.lc) + (0 if args.lp is None else args.lp) > 4:
+    sys.exit('lc + lp must not exceed 4!')
+filters = get_filters(args.preset, args.extreme, args.dict_size, args.lc, args.lp, args.pb)
+
+if args.report:
+    presets = [preset | flag for preset in range(10) for flag in [0, lzma.PRESET_EXTREME]]
+    report(args.inputs, presets, filters)
+    sys.exit()
+
+if args.outputs is None or len(args.outputs) != len(args.inputs):
+    sys.exit('Every input needs an output!')
+pairs = list(zip(args.inputs, args.outputs))
+if len(pairs) == 1 or args.jobs <= 1:
+    for in_path, out_path in pairs:
+        compress(in_path, out_path, filters)
+else:
+    # liblzma releases the GIL, so threads are enough to compress concurrently.
+    with ThreadPoolExecutor(max_workers = args.jobs) as executor:
+        for future in [executor.submit(compress, *pair, filters) for pair in pairs]:
+            future.result()
@@ -3,31 +3,71 @@
 
 from argparse import ArgumentParser
 import json5
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor', 'wuj5'))
+from bmg import pack_bmg
+from cache import Cache, get_default_cache_dir
+from parse import load_tree
+
+
+def load(in_path, sources, cache, strict_json):
+    # The same fallback messages are merged into every language, they are only parsed once.
+    in_data = sources.get(in_path)
+    if in_data is None:
+        with open(in_path, 'rb') as in_file:
+            in_data: dict[str, str | dict] = load_tree(in_file.read(), cache, strict_json)
+        sources[in_path] = in_data
+    return in_data
+
+def merge(in_paths, sources, cache, strict_json):
+    messages: dict = {}
+    for in_path in in_paths:
+        in_data = load(in_path, sources, cache, strict_json)
+
+        for message_id, message in in_data.items():
+            if isinstance(message, str) or message is None:
+                messages[message_id] = {
+                    "string": message,
+                    "font": "regular"
+                }
+            else:
+                messages[message_id] = {
+                    "string": message["string"],
+                    "font": message.get("font", "regular")
+                }
+
+    return dict(sorted(messages.items(), key = lambda item: int(item[0], 0)))
 
 
 parser = ArgumentParser()
-parser.add_argument('inputs', nargs = '+')
+parser.add_argument('inputs', nargs = '*')
 parser.add_argument('-o', '--output')
+parser.add_argument('--batch', action = 'append', nargs = '+', metavar = ('OUTPUT', 'INPUTS'),
+                    help = 'Merge the inputs and pack them straight to a bmg file, can be repeated')
+parser.add_argument('--strict-json', action = 'store_true',
+                    help = 'Parse with the json module, json5 only as a fallback')
+parser.add_argument('--no-cache', action = 'store_true')
+parser.add_argument('--cache-dir', default = get_default_cache_dir())
 args = parser.parse_args()
 
-messages: dict = {}
-for in_path in args.inputs:
-    with open(in_path, 'r', encoding = 'utf-8') as in_file:
-        in_data: dict[str, str | dict] = json5.load(in_file) # type: ignore
-
-    for message_id, message in in_data.items():
-        if isinstance(message, str) or message is None:
-            messages[message_id] = {
-                "string": message,
-                "font": "regular"
-            }
-        else:
-            messages[message_id] = {
-                "string": message["string"],
-                "font": message.get("font", "regular")
-            }
-
-messages = dict(sorted(messages.items(), key = lambda item: int(item[0], 0)))
-out_data = json5.dumps(messages, ensure_ascii = False, indent = 4, quote_keys = True)
-with open(args.output, 'w', encoding = 'utf-8') as out_file:
-    out_file.write(out_data)
+cache = None
+if not args.no_cache:
+    cache = Cache(args.cache_dir)
+sources = {}
+if args.batch is not None:
+    for out_path, *in_paths in args.batch:
+        if not in_paths:
+            sys.exit(f'No inputs for {out_path}.')
+        out_data = pack_bmg(merge(in_paths, sources, cache, args.strict_json))
+        with open(out_path, 'wb') as out_file:
+            out_file.write(out_data)
+
+if args.inputs:
+    if args.output is None:
+        sys.exit('No output path.')
+    messages = merge(args.inputs, sources, cache, args.strict_json)
+    out_data = json5.dumps(messages, ensure_ascii = False, indent = 4, quote_keys = True)
+    with open(args.output, 'w', encoding = 'utf-8') as out_file:
+        out_file.write(out_data)
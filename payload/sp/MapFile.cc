@@ -15,6 +15,7 @@ extern "C" {
 
 #include <vendor/magic_enum/magic_enum.hpp>
 
+#include <algorithm>
 #include <charconv>
 #include <cmath>
 #include <cstdio>
@@ -25,7 +26,21 @@ namespace SP::MapFile {
 
 #define SYMBOL_ADDRESS_LENGTH 10
 
+// Binary map written by generate_symbol_map.py --format binary (see smap.py): sorted addresses,
+// then one offset per address into a pool of NUL-terminated names.
+struct BinaryMapHeader {
+    u32 magic;
+    u32 version;
+    u32 count;
+    u32 namesOffset;
+};
+static_assert(sizeof(BinaryMapHeader) == 0x10);
+
+#define BINARY_MAP_MAGIC 0x534D4150 // SMAP
+#define BINARY_MAP_VERSION 1
+
 static std::optional<std::string_view> s_mapFile = {};
+static const BinaryMapHeader *s_binaryMap = nullptr;
 
 bool IsLoaded() {
     return s_mapFile.has_value();
@@ -49,6 +64,22 @@ void Load() {
     SP_LOG("Successfully read the map file '%s'!", mapFilePath);
 
     s_mapFile = std::string_view{reinterpret_cast<const char *>(mapFile), mapFileSize};
+
+    if (mapFileSize < sizeof(BinaryMapHeader)) {
+        return;
+    }
+    auto *header = reinterpret_cast<const BinaryMapHeader *>(mapFile);
+    if (header->magic != BINARY_MAP_MAGIC) {
+        return;
+    }
+    if (header->version != BINARY_MAP_VERSION || header->count > mapFileSize / 8 ||
+            header->namesOffset < sizeof(BinaryMapHeader) + header->count * 8 ||
+            header->namesOffset > mapFileSize) {
+        SP_LOG("Invalid binary map file '%s'!", mapFilePath);
+        s_mapFile.reset();
+        return;
+    }
+    s_binaryMap = header;
 }
 
 static std::optional<u32> GetSymbolAddress(std::string_view sv) {
@@ -112,11 +143,35 @@ static std::optional<Symbol> GetNextSymbol(u32 &mapFilePos) {
     return Symbol{*symbolAddress, line};
 }
 
+static std::optional<Symbol> BinarySymbolLowerBound(u32 address) {
+    if (s_binaryMap->count == 0) {
+        return std::nullopt;
+    }
+
+    auto *addresses = reinterpret_cast<const u32 *>(s_binaryMap + 1);
+    auto *nameOffsets = addresses + s_binaryMap->count;
+    std::string_view names = s_mapFile->substr(s_binaryMap->namesOffset);
+
+    // Like the text lookup: the last symbol below the address, or the first one.
+    const u32 *it = std::lower_bound(addresses, addresses + s_binaryMap->count, address);
+    size_t index = it == addresses ? 0 : it - addresses - 1;
+    if (nameOffsets[index] >= names.size()) {
+        return std::nullopt;
+    }
+    std::string_view name = names.substr(nameOffsets[index]);
+    name = name.substr(0, name.find('\0'));
+    return Symbol{addresses[index], name};
+}
+
 std::optional<Symbol> SymbolLowerBound(u32 address) {
     if (!IsLoaded()) {
         return std::nullopt;
     }
 
+    if (s_binaryMap) {
+        return BinarySymbolLowerBound(address);
+    }
+
     u32 mapFilePos = 0;
 
     std::optional<Symbol> prevSymbol = GetNextSymbol(mapFilePos);
@@ -0,0 +1,360 @@
+#include "CompactFrameDecoder.hh"
+
+#include <algorithm>
+#include <cmath>
+
+namespace SP {
+
+static constexpr u32 POS_BITS = 25;
+static constexpr u32 ROT_BITS = 12;
+static constexpr u32 SPEED_BITS = 16;
+static constexpr f32 POS_SCALE = 16.0f;
+static constexpr f32 ROT_SCALE = 2047.0f * 1.41421356f;
+static constexpr f32 SPEED_SCALE = 128.0f;
+
+static constexpr u32 TIME_DELTA_LENGTH_BITS = 6;
+static constexpr u32 POS_DELTA_LENGTH_BITS = 5;
+static constexpr u32 ROT_DELTA_LENGTH_BITS = 4;
+static constexpr u32 SPEED_DELTA_LENGTH_BITS = 5;
+
+bool CompactFrameDecoder::decode(const RaceServerCompactFrame &compactFrame,
+        RaceServerFrame &frame) {
+    const Frame *base = nullptr;
+    if (compactFrame.has_baseTime) {
+        base = findBase(compactFrame.baseTime);
+        if (!base) {
+            return false;
+        }
+    }
+
+    BitReader reader(compactFrame.players.bytes, compactFrame.players.size);
+    u32 playerCount;
+    if (!reader.read(4, playerCount)) {
+        return false;
+    }
+    if (playerCount > m_decoded.players.size()) {
+        return false;
+    }
+    if (base && base->playerCount != playerCount) {
+        return false;
+    }
+
+    m_decoded.time = compactFrame.time;
+    m_decoded.playerCount = playerCount;
+    for (u32 i = 0; i < playerCount; i++) {
+        const PlayerState *basePlayer = base ? &base->players[i] : nullptr;
+        if (!DecodePlayer(reader, basePlayer, m_decoded.players[i])) {
+            return false;
+        }
+    }
+    if (!reader.done()) {
+        return false;
+    }
+
+    frame.time = compactFrame.time;
+    frame.playerTimes_count = playerCount;
+    frame.players_count = playerCount;
+    for (u32 i = 0; i < playerCount; i++) {
+        frame.playerTimes[i] = m_decoded.players[i].time;
+        Dequantize(m_decoded.players[i], frame.players[i]);
+    }
+    return true;
+}
+
+void CompactFrameDecoder::accept() {
+    if (m_frames.full()) {
+        m_frames.pop_front();
+    }
+    m_frames.push_back(std::move(m_decoded));
+}
+
+CompactFrameDecoder::BitReader::BitReader(const u8 *data, size_t size)
+    : m_data(data), m_size(size) {}
+
+bool CompactFrameDecoder::BitReader::read(u32 bits, u32 &value) {
+    assert(bits <= 32);
+    if (bits > m_size * 8 - m_offset) {
+        return false;
+    }
+
+    value = 0;
+    for (u32 i = 0; i < bits; i++, m_offset++) {
+        value |= static_cast<u32>(m_data[m_offset / 8] >> (m_offset % 8) & 1) << i;
+    }
+    return true;
+}
+
+bool CompactFrameDecoder::BitReader::readSigned(u32 bits, s32 &value) {
+    u32 raw;
+    if (!read(bits, raw)) {
+        return false;
+    }
+
+    value = static_cast<s32>(raw << (32 - bits)) >> (32 - bits);
+    return true;
+}
+
+bool CompactFrameDecoder::BitReader::readDelta(u32 lengthBits, s64 &value) {
+    u32 length;
+    if (!read(lengthBits, length)) {
+        return false;
+    }
+
+    if (length == 0) {
+        value = 0;
+        return true;
+    }
+    // Larger deltas would put any field out of range.
+    if (length > 33) {
+        return false;
+    }
+
+    u64 zigzagged = static_cast<u64>(1) << (length - 1);
+    if (length > 1) {
+        u32 low;
+        if (!read(length - 1, low)) {
+            return false;
+        }
+        zigzagged |= low;
+    }
+    value = zigzagged & 1 ? -static_cast<s64>(zigzagged >> 1) - 1 : zigzagged >> 1;
+    return true;
+}
+
+bool CompactFrameDecoder::BitReader::done() const {
+    if (m_size * 8 - m_offset >= 8) {
+        return false;
+    }
+
+    for (size_t offset = m_offset; offset < m_size * 8; offset++) {
+        if (m_data[offset / 8] >> (offset % 8) & 1) {
+            return false;
+        }
+    }
+    return true;
+}
+
+const CompactFrameDecoder::Frame *CompactFrameDecoder::findBase(u32 time) const {
+    for (size_t i = 0; i < m_frames.count(); i++) {
+        if (m_frames[i]->time == time) {
+            return m_frames[i];
+        }
+    }
+
+    return nullptr;
+}
+
+bool CompactFrameDecoder::DecodePlayer(BitReader &reader, const PlayerState *base,
+        PlayerState &state) {
+    if (!base) {
+        u32 time, inputState;
+        if (!reader.read(32, time) || !reader.read(16, inputState)) {
+            return false;
+        }
+        state.time = time;
+        state.inputState = inputState;
+
+        if (!DecodeTimers(reader, state)) {
+            return false;
+        }
+
+        for (u32 i = 0; i < 3; i++) {
+            if (!reader.readSigned(POS_BITS, state.pos[i])) {
+                return false;
+            }
+        }
+
+        if (!DecodeRot(reader, state)) {
+            return false;
+        }
+
+        if (!reader.readSigned(SPEED_BITS, state.internalSpeed)) {
+            return false;
+        }
+
+        return IsStateValid(state);
+    }
+
+    s64 timeDelta;
+    if (!reader.readDelta(TIME_DELTA_LENGTH_BITS, timeDelta)) {
+        return false;
+    }
+    s64 time = base->time + timeDelta;
+    if (time < 0 || time > UINT32_MAX) {
+        return false;
+    }
+    state.time = time;
+
+    u32 inputChanged;
+    if (!reader.read(1, inputChanged)) {
+        return false;
+    }
+    if (inputChanged) {
+        u32 inputState;
+        if (!reader.read(16, inputState)) {
+            return false;
+        }
+        state.inputState = inputState;
+    } else {
+        state.inputState = base->inputState;
+    }
+
+    if (!DecodeTimers(reader, state)) {
+        return false;
+    }
+
+    for (u32 i = 0; i < 3; i++) {
+        s64 delta;
+        if (!reader.readDelta(POS_DELTA_LENGTH_BITS, delta)) {
+            return false;
+        }
+        s64 pos = base->pos[i] + delta;
+        if (pos < -(1 << (POS_BITS - 1)) || pos >= 1 << (POS_BITS - 1)) {
+            return false;
+        }
+        state.pos[i] = pos;
+    }
+
+    u32 sameAxis;
+    if (!reader.read(1, sameAxis)) {
+        return false;
+    }
+    if (sameAxis) {
+        state.rotIndex = base->rotIndex;
+        state.rotNegative = base->rotNegative;
+        for (u32 i = 0; i < 3; i++) {
+            s64 delta;
+            if (!reader.readDelta(ROT_DELTA_LENGTH_BITS, delta)) {
+                return false;
+            }
+            s64 rot = base->rot[i] + delta;
+            if (rot < -(1 << (ROT_BITS - 1)) || rot >= 1 << (ROT_BITS - 1)) {
+                return false;
+            }
+            state.rot[i] = rot;
+        }
+    } else {
+        if (!DecodeRot(reader, state)) {
+            return false;
+        }
+    }
+
+    s64 delta;
+    if (!reader.readDelta(SPEED_DELTA_LENGTH_BITS, delta)) {
+        return false;
+    }
+    s64 internalSpeed = base->internalSpeed + delta;
+    if (internalSpeed < -(1 << (SPEED_BITS - 1)) || internalSpeed >= 1 << (SPEED_BITS - 1)) {
+        return false;
+    }
+    state.internalSpeed = internalSpeed;
+
+    return IsStateValid(state);
+}
+
+bool CompactFrameDecoder::DecodeTimers(BitReader &reader, PlayerState &state) {
+    u32 respawn;
+    if (!reader.read(1, respawn)) {
+        return false;
+    }
+    u32 timeBeforeRespawn = 0, timeInRespawn = 0;
+    if (respawn) {
+        if (!reader.read(8, timeBeforeRespawn) || !reader.read(8, timeInRespawn)) {
+            return false;
+        }
+    }
+    state.timeBeforeRespawn = timeBeforeRespawn;
+    state.timeInRespawn = timeInRespawn;
+
+    for (u32 i = 0; i < 3; i++) {
+        u32 boost;
+        if (!reader.read(1, boost)) {
+            return false;
+        }
+        u32 timeBeforeBoostEnd = 0;
+        if (boost) {
+            if (!reader.read(8, timeBeforeBoostEnd)) {
+                return false;
+            }
+        }
+        state.timesBeforeBoostEnd[i] = timeBeforeBoostEnd;
+    }
+
+    return true;
+}
+
+bool CompactFrameDecoder::DecodeRot(BitReader &reader, PlayerState &state) {
+    u32 rotIndex, rotNegative;
+    if (!reader.read(2, rotIndex) || !reader.read(1, rotNegative)) {
+        return false;
+    }
+    state.rotIndex = rotIndex;
+    state.rotNegative = rotNegative;
+
+    for (u32 i = 0; i < 3; i++) {
+        if (!reader.readSigned(ROT_BITS, state.rot[i])) {
+            return false;
+        }
+    }
+
+    return true;
+}
+
+// The encoder saturates to the symmetric range, the most negative values are never sent.
+bool CompactFrameDecoder::IsStateValid(const PlayerState &state) {
+    for (u32 i = 0; i < 3; i++) {
+        if (state.pos[i] == -(1 << (POS_BITS - 1))) {
+            return false;
+        }
+    }
+
+    for (u32 i = 0; i < 3; i++) {
+        if (state.rot[i] == -(1 << (ROT_BITS - 1))) {
+            return false;
+        }
+    }
+
+    return state.internalSpeed != -(1 << (SPEED_BITS - 1));
+}
+
+void CompactFrameDecoder::Dequantize(const PlayerState &state, PlayerFrame &player) {
+    player.inputState.accelerate = state.inputState >> 0 & 1;
+    player.inputState.brake = state.inputState >> 1 & 1;
+    player.inputState.item = state.inputState >> 2 & 1;
+    player.inputState.drift = state.inputState >> 3 & 1;
+    player.inputState.brakeDrift = state.inputState >> 4 & 1;
+    player.inputState.stickX = state.inputState >> 5 & 0xf;
+    player.inputState.stickY = state.inputState >> 9 & 0xf;
+    player.inputState.trick = state.inputState >> 13 & 0x7;
+
+    player.timeBeforeRespawn = state.timeBeforeRespawn;
+    player.timeInRespawn = state.timeInRespawn;
+    player.timesBeforeBoostEnd_count = 3;
+    for (u32 i = 0; i < 3; i++) {
+        player.timesBeforeBoostEnd[i] = state.timesBeforeBoostEnd[i];
+    }
+
+    player.pos.x = state.pos[0] / POS_SCALE;
+    player.pos.y = state.pos[1] / POS_SCALE;
+    player.pos.z = state.pos[2] / POS_SCALE;
+
+    std::array<f32, 4> rot;
+    f32 sum = 0.0f;
+    for (u32 i = 0, j = 0; i < 4; i++) {
+        if (i == state.rotIndex) {
+            continue;
+        }
+        rot[i] = state.rot[j++] / ROT_SCALE;
+        sum += rot[i] * rot[i];
+    }
+    f32 largest = std::sqrt(std::max(1.0f - sum, 0.0f));
+    rot[state.rotIndex] = state.rotNegative ? -largest : largest;
+    player.mainRot.x = rot[0];
+    player.mainRot.y = rot[1];
+    player.mainRot.z = rot[2];
+    player.mainRot.w = rot[3];
+
+    player.internalSpeed = state.internalSpeed / SPEED_SCALE;
+}
+
+} // namespace SP
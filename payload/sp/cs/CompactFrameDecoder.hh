@@ -0,0 +1,65 @@
+#pragma once
+
+#include "sp/CircularBuffer.hh"
+
+#include <protobuf/Room.pb.h>
+
+namespace SP {
+
+// Reconstructs the frames the server sends with the compact race data room setting. The encoding
+// is described in tools/compactframe/README.md, compactframe.py there is the reference.
+class CompactFrameDecoder {
+public:
+    bool decode(const RaceServerCompactFrame &compactFrame, RaceServerFrame &frame);
+    // Keeps the last decoded frame as a base for the next ones, the server only uses the frames
+    // the client acknowledged.
+    void accept();
+
+private:
+    struct PlayerState {
+        u32 time;
+        u16 inputState;
+        u8 timeBeforeRespawn;
+        u8 timeInRespawn;
+        std::array<u8, 3> timesBeforeBoostEnd;
+        u8 rotIndex;
+        bool rotNegative;
+        std::array<s32, 3> pos;
+        std::array<s32, 3> rot;
+        s32 internalSpeed;
+    };
+
+    struct Frame {
+        u32 time;
+        u32 playerCount;
+        std::array<PlayerState, 12> players;
+    };
+
+    class BitReader {
+    public:
+        BitReader(const u8 *data, size_t size);
+
+        bool read(u32 bits, u32 &value);
+        bool readSigned(u32 bits, s32 &value);
+        bool readDelta(u32 lengthBits, s64 &value);
+        bool done() const;
+
+    private:
+        const u8 *m_data;
+        size_t m_size;
+        size_t m_offset = 0;
+    };
+
+    const Frame *findBase(u32 time) const;
+
+    static bool DecodePlayer(BitReader &reader, const PlayerState *base, PlayerState &state);
+    static bool DecodeTimers(BitReader &reader, PlayerState &state);
+    static bool DecodeRot(BitReader &reader, PlayerState &state);
+    static bool IsStateValid(const PlayerState &state);
+    static void Dequantize(const PlayerState &state, PlayerFrame &player);
+
+    CircularBuffer<Frame, 16> m_frames;
+    Frame m_decoded;
+};
+
+} // namespace SP
@@ -8,6 +8,7 @@
 #include <vendor/nanopb/pb_decode.h>
 #include <vendor/nanopb/pb_encode.h>
 
+#include <algorithm>
 #include <cmath>
 
 namespace SP {
@@ -81,10 +82,18 @@ void RaceClient::calcWrite() {
         request.request.race.players[i].internalSpeed = object->getInternalSpeed();
     }
 
+    // Same bytes as pb_encode of the whole request, with the race going through the specialized
+    // encoder.
+    u8 raceBuffer[RoomRequest_Race_size];
+    pb_ostream_t raceStream = pb_ostream_from_buffer(raceBuffer, sizeof(raceBuffer));
+
+    assert(RoomRequest_Race_encode_specialized(&raceStream, &request.request.race));
+
     u8 buffer[RoomRequest_size];
     pb_ostream_t stream = pb_ostream_from_buffer(buffer, sizeof(buffer));
 
-    assert(pb_encode(&stream, RoomRequest_fields, &request));
+    assert(pb_encode_tag(&stream, PB_WT_STRING, RoomRequest_race_tag));
+    assert(pb_encode_string(&stream, raceBuffer, raceStream.bytes_written));
 
     // TODO proper error handling
     m_roomClient.socket().write(buffer, stream.bytes_written);
@@ -96,8 +105,11 @@ void RaceClient::calcWrite() {
 void RaceClient::calcRead() {
     ConnectionGroup connectionGroup(*this);
 
+    auto frameEncoding = m_roomClient.getSetting<ClientSettings::Setting::RoomFrameEncoding>();
+    bool isCompact = frameEncoding == ClientSettings::RoomFrameEncoding::Compact;
+
     while (true) {
-        u8 buffer[RaceServerFrame_size];
+        u8 buffer[std::max(RaceServerFrame_size, RaceServerCompactFrame_size)];
         auto read = m_socket.read(buffer, sizeof(buffer), connectionGroup);
         if (!read) {
             break;
@@ -106,11 +118,25 @@ void RaceClient::calcRead() {
         pb_istream_t stream = pb_istream_from_buffer(buffer, read->size);
 
         RaceServerFrame frame;
-        if (!pb_decode(&stream, RaceServerFrame_fields, &frame)) {
-            continue;
+        if (isCompact) {
+            RaceServerCompactFrame compactFrame;
+            if (!pb_decode(&stream, RaceServerCompactFrame_fields, &compactFrame)) {
+                continue;
+            }
+
+            if (!m_compactFrameDecoder.decode(compactFrame, frame)) {
+                continue;
+            }
+        } else {
+            if (!RaceServerFrame_decode_specialized(&stream, &frame)) {
+                continue;
+            }
         }
 
         if (isFrameValid(frame)) {
+            if (isCompact) {
+                m_compactFrameDecoder.accept();
+            }
             m_frameCount++;
             m_frame = frame;
         }
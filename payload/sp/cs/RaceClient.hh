@@ -1,6 +1,7 @@
 #pragma once
 
 #include "sp/CircularBuffer.hh"
+#include "sp/cs/CompactFrameDecoder.hh"
 #include "sp/cs/RaceManager.hh"
 #include "sp/cs/RoomClient.hh"
 
@@ -48,6 +49,7 @@ private:
     Net::UnreliableSocket::Connection m_connection;
     u32 m_frameCount = 0;
     std::optional<RaceServerFrame> m_frame{};
+    CompactFrameDecoder m_compactFrameDecoder;
     /*CircularBuffer<s32, 60> m_drifts;
     s32 m_drift = 0;*/
 
@@ -566,6 +566,17 @@ const Entry entries[] = {
         .valueExplanationMessageIds = (u32[]) { 10251, 10252, 10253, /* 10254, 10255, 10256, 10257 */ },
         .hidden = !ENABLE_ONLINE,
     },
+    [static_cast<u32>(Setting::RoomFrameEncoding)] = {
+        .category = Category::Room,
+        .name = magic_enum::enum_name(Setting::RoomFrameEncoding),
+        .messageId = 10454,
+        .defaultValue = static_cast<u32>(RoomFrameEncoding::Full),
+        .valueCount = magic_enum::enum_count<RoomFrameEncoding>(),
+        .valueNames = magic_enum::enum_names<RoomFrameEncoding>().data(),
+        .valueMessageIds = (u32[]) { 10455, 10456 },
+        .valueExplanationMessageIds = (u32[]) { 10457, 10458 },
+        .hidden = !ENABLE_ONLINE,
+    },
     [static_cast<u32>(Setting::RoomCodeHigh)] = {
         .category = Category::Room,
         .name = magic_enum::enum_name(Setting::RoomCodeHigh),
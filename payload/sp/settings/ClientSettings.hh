@@ -73,6 +73,7 @@ enum class Setting {
     RoomCourseSelection,
     RoomClass,
     RoomVehicles,
+    RoomFrameEncoding,
     RoomCodeHigh,
     RoomCodeLow,
 
@@ -303,6 +304,11 @@ enum class RoomCourseSelection {
     Vote,
 };
 
+enum class RoomFrameEncoding {
+    Full,
+    Compact,
+};
+
 enum class VSMegaClouds {
     Disable,
     Enable,
@@ -621,6 +627,11 @@ struct Helper<ClientSettings::Setting, ClientSettings::Setting::RoomVehicles> {
     using type = SP::ClientSettings::Vehicles;
 };
 
+template <>
+struct Helper<ClientSettings::Setting, ClientSettings::Setting::RoomFrameEncoding> {
+    using type = SP::ClientSettings::RoomFrameEncoding;
+};
+
 template <>
 struct Helper<ClientSettings::Setting, ClientSettings::Setting::VSMegaClouds> {
     using type = SP::ClientSettings::VSMegaClouds;
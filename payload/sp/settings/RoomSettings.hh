@@ -5,6 +5,6 @@
 namespace SP::RoomSettings {
 
 constexpr u32 offset = static_cast<u32>(ClientSettings::Setting::RoomTeamSize);
-constexpr u32 count = static_cast<u32>(ClientSettings::Setting::RoomVehicles) - offset + 1;
+constexpr u32 count = static_cast<u32>(ClientSettings::Setting::RoomFrameEncoding) - offset + 1;
 
 } // namespace SP::RoomSettings
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import glob
+import json
+import lzma
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor', 'wuj5'))
+from yaz import levels, pack_yaz, unpack_yaz
+
+
+# Throughputs on the console in bytes per second: the storage contents.arc is read from, and each
+# decoder in decoded bytes. These are starting estimates, measure on hardware and pass the results
+# with --model (same layout, as JSON) to calibrate them.
+DEFAULT_MODEL = {
+    'read': 4 * 1024 * 1024,
+    'decode': {
+        'lzma': 3 * 1024 * 1024,
+        'yaz': 24 * 1024 * 1024,
+    },
+}
+
+# Only the codecs that SP::Storage::DecompLoader recognizes by their magic, an uncompressed U8
+# archive would be handed to the LZMA decoder.
+CODECS = ['lzma', 'yaz']
+
+def get_u8_data(in_data):
+    if in_data[:0x4] == b'Yaz0':
+        return bytes(unpack_yaz(in_data))
+    if in_data[:0x4] == b'U\xaa8-':
+        return in_data
+    return lzma.decompress(in_data)
+
+def compress(u8_data, codec, level):
+    return {
+        'lzma': lambda: lzma.compress(u8_data, format = lzma.FORMAT_ALONE),
+        'yaz': lambda: pack_yaz(u8_data, level),
+    }[codec]()
+
+def estimate_load_time(model, codec, u8_size, size):
+    # The loader reads the next chunk while the current one is decoded, so the slowest of the two
+    # dominates.
+    return max(size / model['read'], u8_size / model['decode'][codec])
+
+def measure(in_path, model, level):
+    with open(in_path, 'rb') as in_file:
+        u8_data = get_u8_data(in_file.read())
+    candidates = {}
+    for codec in CODECS:
+        size = len(compress(u8_data, codec, level))
+        candidates[codec] = (size, estimate_load_time(model, codec, len(u8_data), size))
+    return len(u8_data), candidates
+
+def plan(archives, budget):
+    # Start from the fastest codec for every archive, then trade load time for size where it
+    # costs the least until the budget is met.
+    choices = {}
+    for target, (_, candidates) in archives.items():
+        choices[target] = min(candidates, key = lambda codec: candidates[codec][1])
+    total_size = sum(archives[target][1][codec][0] for target, codec in choices.items())
+    while budget is not None and total_size > budget:
+        best = None
+        for target, (_, candidates) in archives.items():
+            size, load_time = candidates[choices[target]]
+            for codec, (other_size, other_load_time) in candidates.items():
+                if other_size >= size:
+                    continue
+                cost = (other_load_time - load_time) / (size - other_size)
+                if best is None or cost < best[0]:
+                    best = (cost, target, codec)
+        if best is None:
+            sys.exit(f'Cannot fit the archives in {budget} bytes (at least {total_size} bytes).')
+        _, target, codec = best
+        total_size -= archives[target][1][choices[target]][0] - archives[target][1][codec][0]
+        choices[target] = codec
+    return choices
+
+def print_report(archives, choices):
+    header = f'{"archive":<40} {"u8":>9}'
+    for codec in CODECS:
+        header += f' {codec:>9} {"ms":>6}'
+    print(header + '  choice')
+    total_size = 0
+    total_time = 0
+    for target, (u8_size, candidates) in sorted(archives.items()):
+        line = f'{target:<40} {u8_size:>9}'
+        for codec in CODECS:
+            size, load_time = candidates[codec]
+            line += f' {size:>9} {load_time * 1000:>6.1f}'
+        print(line + f'  {choices[target]}')
+        total_size += candidates[choices[target]][0]
+        total_time += candidates[choices[target]][1]
+    print(f'Total: {total_size} bytes, {total_time * 1000:.1f}ms')
+
+
+parser = ArgumentParser()
+parser.add_argument('contents_dir', nargs='?', default=os.path.join('build', 'contents.arc.d'))
+parser.add_argument('-o', '--out-path', default=os.path.join('build', 'compression_plan.json'))
+parser.add_argument('--model', help='JSON file with measured throughputs')
+parser.add_argument('--budget', type=int, help='Maximum total size of the archives in bytes')
+parser.add_argument('--level', choices=levels.keys(), default='greedy',
+                    help='Yaz0 level, stored in the plan for the build to pass to wuj5')
+args = parser.parse_args()
+
+model = DEFAULT_MODEL
+if args.model is not None:
+    with open(args.model, 'r') as model_file:
+        model = json.load(model_file)
+
+in_paths = sorted(glob.glob('**/*.arc.lzma', root_dir = args.contents_dir, recursive = True))
+if not in_paths:
+    sys.exit(f'No archives found in {args.contents_dir}, build them first!')
+archives = {}
+for in_path in in_paths:
+    target = in_path.replace(os.sep, '/')
+    archives[target] = measure(os.path.join(args.contents_dir, in_path), model, args.level)
+
+choices = plan(archives, args.budget)
+print_report(archives, choices)
+# The sizes were measured at this level, so the build has to pack the archives with it as well.
+entries = {}
+for target, codec in choices.items():
+    entries[target] = {'codec': codec}
+    if codec == 'yaz':
+        entries[target]['level'] = args.level
+with open(args.out_path, 'w') as out_file:
+    json.dump(entries, out_file, indent = 4, sort_keys = True)
+    out_file.write('\n')
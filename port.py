@@ -2,6 +2,7 @@
 
 
 from argparse import ArgumentParser
+from bisect import bisect_right
 from dataclasses import dataclass
 import sys
 from typing import Dict, List
@@ -640,139 +641,210 @@ CHUNKS = {
 }
 
 
+class ChunkIndex:
+    def __init__(self, chunks):
+        # Chunks don't overlap, so sorting them by start address is enough to find the only one
+        # that can contain an address.
+        self.chunks = sorted(chunks, key = lambda chunk: chunk.src_start)
+        self.starts = [chunk.src_start for chunk in self.chunks]
+
+    def find(self, address):
+        i = bisect_right(self.starts, address) - 1
+        if i < 0 or address not in self.chunks[i]:
+            return None
+        return self.chunks[i]
+
+class SectionIndex:
+    def __init__(self, binaries):
+        sections = [(section, module) for module, binary in binaries.items() for section in binary.sections]
+        sections.sort(key = lambda entry: entry[0].start)
+        self.sections = sections
+        self.starts = [section.start for section, _ in sections]
+
+    def find(self, address):
+        i = bisect_right(self.starts, address) - 1
+        if i < 0 or address not in self.sections[i][0]:
+            return None, None
+        return self.sections[i]
+
+CHUNK_INDICES = {region: ChunkIndex(chunks) for region, chunks in CHUNKS.items()}
+SECTION_INDICES = {region: SectionIndex(binaries) for region, binaries in SRC_BINARIES.items()}
+
+REGIONS = ['P', 'E', 'J', 'K']
+
 def write_symbol(out_file, name, address):
     out_file.write(f'    {name} = {address:#x};\n');
 
 def get_binary_name(region, address):
-    return next(module for module, sections in SRC_BINARIES[region].items() if address in sections)
+    _, module = SECTION_INDICES[region].find(address)
+    return module
 
 def port(region, address):
     if region == 'P':
         return address
 
-    return next((chunk.port(address) for chunk in CHUNKS[region] if address in chunk), None)
-
-
-parser = ArgumentParser()
-parser.add_argument('region')
-parser.add_argument('in_path')
-parser.add_argument('out_path')
-parser.add_argument('--base', action='store_true')
-args = parser.parse_args()
-
-validRegionList = ['P', 'E', 'J', 'K']
-if args.region not in validRegionList:
-    sys.exit(f'The specified region \'{args.region}\' is invalid! Valid regions include: {", ".join(validRegionList)}!')
-
-with open(args.out_path, 'w') as out_file:
-    out_file.write('PHDRS {\n')
-    out_file.write('    text PT_LOAD;\n')
-    out_file.write('    rodata PT_LOAD;\n')
-    out_file.write('    data PT_LOAD;\n')
-    out_file.write('}\n')
-    out_file.write('\n')
-
-    out_file.write('SECTIONS {\n')
-    out_file.write('    .text base : { *(first) *(.text*) *(thunks*) } :text\n')
-    out_file.write('    .ctors : { *(.ctors*) } :rodata\n')
-    out_file.write('    patches : { *(patches*) } :rodata\n')
-    out_file.write('    commands : { *(commands*) } :rodata\n')
-    out_file.write('    .rodata : { *(.rodata*) } :rodata\n')
-    out_file.write('    .data : { *(.data*) *(.bss*) *(.sbss*) } :data\n')
-    out_file.write('\n')
-
-    # Write the start and end address for each section in the payload
-    out_file.write('    payload_text_start = ADDR(.text);\n')
-    out_file.write('    payload_text_end = payload_text_start + SIZEOF(.text);\n')
-    out_file.write('    payload_replacements_start = ADDR(replacements);\n')
-    out_file.write('    payload_replacements_end = payload_replacements_start + SIZEOF(replacements);\n')
-    out_file.write('    payload_ctors_start = ADDR(.ctors);\n')
-    out_file.write('    payload_ctors_end = payload_ctors_start + SIZEOF(.ctors);\n')
-    out_file.write('    payload_patches_start = ADDR(patches);\n')
-    out_file.write('    payload_patches_end = payload_patches_start + SIZEOF(patches);\n')
-    out_file.write('    payload_rodata_start = ADDR(.rodata);\n')
-    out_file.write('    payload_rodata_end = payload_rodata_start + SIZEOF(.rodata);\n')
-    out_file.write('    payload_data_start = ADDR(.data);\n')
-    out_file.write('    payload_data_end = payload_data_start + SIZEOF(.data);\n')
-    out_file.write('\n')
-
-    if args.base:
-        for region in DST_BINARIES:
-            for module in DST_BINARIES[region]:
-                DST_BINARIES[region][module].start = SRC_BINARIES[region][module].start
-                DST_BINARIES[region][module].end = max(section.end for section in SRC_BINARIES[region][module].sections)
-
-    # Write the start and end address for each module
-    for module in DST_BINARIES[args.region]:
-        write_symbol(out_file, f'{module}_start', DST_BINARIES[args.region][module].start)
-        write_symbol(out_file, f'{module}_end', DST_BINARIES[args.region][module].end)
+    chunk = CHUNK_INDICES[region].find(address)
+    return None if chunk is None else chunk.port(address)
+
+def port_many(region, addresses):
+    if region == 'P':
+        return list(addresses)
+
+    index = CHUNK_INDICES[region]
+    ported = []
+    for address in addresses:
+        chunk = index.find(address)
+        ported += [None if chunk is None else chunk.port(address)]
+    return ported
+
+def read_symbols(in_path):
+    symbols = []
+    with open(in_path, 'r') as in_file:
+        for line in in_file.readlines():
+            if line.isspace():
+                symbols += [None]
+                continue
+            address, name = line.split()
+            symbols += [(name, int(address, 16))]
+    return symbols
+
+def write_script(out_path, region, symbols, base):
+    if base:
+        dst_binaries = {
+            module: DstBinary(binary.start, max(section.end for section in binary.sections))
+            for module, binary in SRC_BINARIES[region].items()
+        }
+    else:
+        dst_binaries = DST_BINARIES[region]
+
+    with open(out_path, 'w') as out_file:
+        out_file.write('PHDRS {\n')
+        out_file.write('    text PT_LOAD;\n')
+        out_file.write('    rodata PT_LOAD;\n')
+        out_file.write('    data PT_LOAD;\n')
+        out_file.write('}\n')
         out_file.write('\n')
 
-    # Write the start and end address for each section in the dol
-    for section in SRC_BINARIES[args.region]['dol'].sections:
-        write_symbol(out_file, f'dol_{section.name}_start', section.start)
-        write_symbol(out_file, f'dol_{section.name}_end', section.end)
-    out_file.write('\n')
-
-    # Write the start and end address for each section in the rel
-    mkw_sp_rel_section_address = DST_BINARIES[args.region]['rel'].start
-    mkw_sp_rel_section_address += 0x4C # sizeof(OSModuleHeader)
-    mkw_sp_rel_section_address += 0x88 # sizeof(OSSectionInfo) * 0x11
-    for i in range(len(SRC_BINARIES[args.region]['rel'].sections)):
-        section = SRC_BINARIES[args.region]['rel'].sections[i]
-
-        # If the start address of the next section is greater than the end address of the previous section
-        if i > 0 and section.start > rel_previous_section_end_address:
-            # Add the difference
-            mkw_sp_rel_section_address += section.start - rel_previous_section_end_address
-
-        write_symbol(out_file, f'rel_{section.name}_start', mkw_sp_rel_section_address)
-        mkw_sp_rel_section_address += section.end - section.start
-        write_symbol(out_file, f'rel_{section.name}_end', mkw_sp_rel_section_address)
-        rel_previous_section_end_address = section.end
-    out_file.write('\n')
-
-    write_symbol(out_file, 'versionInfo', 0x80003f00)
-    out_file.write('\n')
-
-    with open(args.in_path, 'r') as symbols:
-        for symbol in symbols.readlines():
-            if symbol.isspace():
+        out_file.write('SECTIONS {\n')
+        out_file.write('    .text base : { *(first) *(.text*) *(thunks*) } :text\n')
+        out_file.write('    .ctors : { *(.ctors*) } :rodata\n')
+        out_file.write('    patches : { *(patches*) } :rodata\n')
+        out_file.write('    commands : { *(commands*) } :rodata\n')
+        out_file.write('    .rodata : { *(.rodata*) } :rodata\n')
+        out_file.write('    .data : { *(.data*) *(.bss*) *(.sbss*) } :data\n')
+        out_file.write('\n')
+
+        # Write the start and end address for each section in the payload
+        out_file.write('    payload_text_start = ADDR(.text);\n')
+        out_file.write('    payload_text_end = payload_text_start + SIZEOF(.text);\n')
+        out_file.write('    payload_replacements_start = ADDR(replacements);\n')
+        out_file.write('    payload_replacements_end = payload_replacements_start + SIZEOF(replacements);\n')
+        out_file.write('    payload_ctors_start = ADDR(.ctors);\n')
+        out_file.write('    payload_ctors_end = payload_ctors_start + SIZEOF(.ctors);\n')
+        out_file.write('    payload_patches_start = ADDR(patches);\n')
+        out_file.write('    payload_patches_end = payload_patches_start + SIZEOF(patches);\n')
+        out_file.write('    payload_rodata_start = ADDR(.rodata);\n')
+        out_file.write('    payload_rodata_end = payload_rodata_start + SIZEOF(.rodata);\n')
+        out_file.write('    payload_data_start = ADDR(.data);\n')
+        out_file.write('    payload_data_end = payload_data_start + SIZEOF(.data);\n')
+        out_file.write('\n')
+
+        # Write the start and end address for each module
+        for module in dst_binaries:
+            write_symbol(out_file, f'{module}_start', dst_binaries[module].start)
+            write_symbol(out_file, f'{module}_end', dst_binaries[module].end)
+            out_file.write('\n')
+
+        # Write the start and end address for each section in the dol
+        for section in SRC_BINARIES[region]['dol'].sections:
+            write_symbol(out_file, f'dol_{section.name}_start', section.start)
+            write_symbol(out_file, f'dol_{section.name}_end', section.end)
+        out_file.write('\n')
+
+        # Write the start and end address for each section in the rel
+        mkw_sp_rel_section_address = dst_binaries['rel'].start
+        mkw_sp_rel_section_address += 0x4C # sizeof(OSModuleHeader)
+        mkw_sp_rel_section_address += 0x88 # sizeof(OSSectionInfo) * 0x11
+        for i in range(len(SRC_BINARIES[region]['rel'].sections)):
+            section = SRC_BINARIES[region]['rel'].sections[i]
+
+            # If the start address of the next section is greater than the end address of the previous section
+            if i > 0 and section.start > rel_previous_section_end_address:
+                # Add the difference
+                mkw_sp_rel_section_address += section.start - rel_previous_section_end_address
+
+            write_symbol(out_file, f'rel_{section.name}_start', mkw_sp_rel_section_address)
+            mkw_sp_rel_section_address += section.end - section.start
+            write_symbol(out_file, f'rel_{section.name}_end', mkw_sp_rel_section_address)
+            rel_previous_section_end_address = section.end
+        out_file.write('\n')
+
+        write_symbol(out_file, 'versionInfo', 0x80003f00)
+        out_file.write('\n')
+
+        # At the moment, this script only supports porting addresses from the PAL version of the game to other versions of the game
+        bss_section = next((section for section in SRC_BINARIES['P']['rel'].sections if section.name == 'bss'), None)
+        if bss_section is None:
+            sys.exit('Couldn\'t find the \'.bss\' section of the \'StaticR.rel\' module!')
+        rel_bss_offset = {
+            'P': 0xe02ec,
+            'E': 0xe028c,
+            'J': 0xe020c,
+            'K': 0xe048c,
+        }[region]
+        addresses = port_many(region, [symbol[1] for symbol in symbols if symbol is not None])
+        addresses.reverse()
+        for symbol in symbols:
+            if symbol is None:
                 out_file.write('\n')
                 continue
-            address, name = symbol.split()
-            address = int(address, 16)
-
-            # At the moment, this script only supports porting addresses from the PAL version of the game to other versions of the game
-            binary_name = get_binary_name('P', address)
-            bss_section = next((section for section in SRC_BINARIES['P']['rel'].sections if section.name == 'bss'), None)
-            if bss_section is None:
-                sys.exit('Couldn\'t find the \'.bss\' section of the \'StaticR.rel\' module!')
-            is_rel_bss = bss_section.start <= address < bss_section.end
+            name, src_address = symbol
+            address = addresses.pop()
+            binary_name = get_binary_name('P', src_address)
+            is_rel_bss = src_address in bss_section
 
-            address = port(args.region, address)
             if address is None:
-                sys.exit(f'Couldn\'t port symbol {name} to region {args.region}!')
-            if is_rel_bss and not args.base:
-                address -= {
-                    'P': 0xe02ec,
-                    'E': 0xe028c,
-                    'J': 0xe020c,
-                    'K': 0xe048c,
-                }[args.region]
-            address -= SRC_BINARIES[args.region][binary_name].start
-            address += DST_BINARIES[args.region][binary_name].start
+                sys.exit(f'Couldn\'t port symbol {name} to region {region}!')
+            if is_rel_bss and not base:
+                address -= rel_bss_offset
+            address -= SRC_BINARIES[region][binary_name].start
+            address += dst_binaries[binary_name].start
             write_symbol(out_file, name, address)
-    out_file.write('\n')
-
-    write_symbol(out_file, 'vtr', 0xcc002000);
-    write_symbol(out_file, 'dcr', 0xcc002002);
-    write_symbol(out_file, 'vto', 0xcc00200c);
-    write_symbol(out_file, 'vte', 0xcc002010);
-    write_symbol(out_file, 'tfbl', 0xcc00201c);
-    write_symbol(out_file, 'bfbl', 0xcc002024);
-    write_symbol(out_file, 'hsw', 0xcc002048);
-    write_symbol(out_file, 'hsr', 0xcc00204a);
-    write_symbol(out_file, 'visel', 0xcc00206e);
-
-    out_file.write('}\n')
+        out_file.write('\n')
+
+        write_symbol(out_file, 'vtr', 0xcc002000);
+        write_symbol(out_file, 'dcr', 0xcc002002);
+        write_symbol(out_file, 'vto', 0xcc00200c);
+        write_symbol(out_file, 'vte', 0xcc002010);
+        write_symbol(out_file, 'tfbl', 0xcc00201c);
+        write_symbol(out_file, 'bfbl', 0xcc002024);
+        write_symbol(out_file, 'hsw', 0xcc002048);
+        write_symbol(out_file, 'hsr', 0xcc00204a);
+        write_symbol(out_file, 'visel', 0xcc00206e);
+
+        out_file.write('}\n')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('region', nargs='?')
+    parser.add_argument('in_path')
+    parser.add_argument('out_path', help='With --all-regions, {region} is replaced by each region')
+    parser.add_argument('--base', action='store_true')
+    parser.add_argument('--all-regions', action='store_true')
+    args = parser.parse_args()
+
+    if args.all_regions:
+        if args.region is not None:
+            sys.exit('A region can\'t be specified together with --all-regions!')
+        if '{region}' not in args.out_path:
+            sys.exit('The output path must contain \'{region}\' when using --all-regions!')
+        regions = REGIONS
+    else:
+        if args.region not in REGIONS:
+            sys.exit(f'The specified region \'{args.region}\' is invalid! Valid regions include: {", ".join(REGIONS)}!')
+        regions = [args.region]
+
+    symbols = read_symbols(args.in_path)
+    for region in regions:
+        write_script(args.out_path.replace('{region}', region), region, symbols, args.base)
@@ -2,11 +2,11 @@
 
 
 from argparse import ArgumentParser
-import copy
-from elftools.elf.elffile import ELFFile
 import itanium_demangler
 import sys
 
+from elf import Elf, SHN_UNDEF, STT_FUNC, STT_OBJECT
+
 
 parser = ArgumentParser()
 parser.add_argument('in_elf_path')
@@ -15,61 +15,58 @@ parser.add_argument('out_symbols_path')
 parser.add_argument('out_replacements_path')
 args = parser.parse_args()
 
+demangled_names = {}
+def demangle(name):
+    demangled = demangled_names.get(name)
+    if demangled is None:
+        demangled = itanium_demangler.parse(name)
+        if demangled is not None:
+            demangled = str(demangled)
+        else:
+            demangled = name
+        demangled_names[name] = demangled
+    return demangled
+
 replaced_symbols = []
 replacement_symbols = []
 regular_symbols = []
-with open(args.in_elf_path, 'rb') as elf_file:
-    elf = ELFFile(elf_file)
-
-    replacements_section_index = None
-    for index, section in enumerate(elf.iter_sections()):
-        if section.name == 'replacements':
-            replacements_section_index = index
-
-    symtab = elf.get_section_by_name('.symtab')
-
-    for symbol in symtab.iter_symbols():
-        symbol_type = symbol['st_info']['type']
-        if symbol['st_shndx'] == 'SHN_UNDEF':
-            demangled = itanium_demangler.parse(symbol.name)
-            if demangled is not None:
-                demangled = str(demangled)
-            else:
-                demangled = symbol.name
+with Elf(args.in_elf_path) as elf:
+    replacements_section_index = elf.get_section_index('replacements')
+
+    for symbol in elf.get_symbols():
+        if symbol.shndx == SHN_UNDEF:
+            demangled = demangle(symbol.name)
             if 'thunk_replaced_' not in demangled:
                 continue
             demangled = demangled.replace('thunk_replaced_', '', 1)
             replaced_symbols += [(symbol.name, demangled)]
-        elif symbol['st_shndx'] == replacements_section_index:
-            if symbol_type != 'STT_FUNC':
+        elif symbol.shndx == replacements_section_index:
+            if symbol.type != STT_FUNC:
                 continue
 
             replacement_symbols += [symbol.name]
-        elif symbol_type == 'STT_FUNC' or symbol_type == 'STT_OBJECT':
+        elif symbol.type == STT_FUNC or symbol.type == STT_OBJECT:
             regular_symbols += [symbol.name]
 
+# The first replacement symbol wins if several of them demangle to the same name.
+replacement_names = {}
+for name in replacement_symbols:
+    replacement_names.setdefault(demangle(name), name)
+
 thunk_symbols = {}
 for symbol_name, demangled in replaced_symbols:
-    replacement_name = None
-    for other_name in replacement_symbols:
-        other_demangled = itanium_demangler.parse(other_name)
-        if other_demangled is not None:
-            other_demangled = str(other_demangled)
-        else:
-            other_demangled = other_name
-        if other_demangled == demangled:
-            replacement_name = other_name
-            break
+    replacement_name = replacement_names.get(demangled)
     if replacement_name is None:
         sys.exit(f'REPLACED was used without REPLACE for symbol {symbol_name}!')
     thunk_symbols[replacement_name] = symbol_name
 
-backup = copy.deepcopy(replacement_symbols)
-out_symbols = ''
+regular_symbols = set(regular_symbols)
+remaining_symbols = set(replacement_symbols)
+out_symbols = []
 with open(args.in_symbols_path, 'r') as in_symbols_file:
     for symbol in in_symbols_file.readlines():
         if symbol.isspace():
-            out_symbols += '\n'
+            out_symbols += ['\n']
             continue
 
         address, name = symbol.split()
@@ -78,28 +75,30 @@ with open(args.in_symbols_path, 'r') as in_symbols_file:
         if name in regular_symbols:
             sys.exit(f'Multiple definitions for symbol {name}!')
 
-        if name in replacement_symbols:
-            replacement_symbols.remove(name)
+        if name in remaining_symbols:
+            remaining_symbols.remove(name)
             name = 'replaced_' + name
-        out_symbols += f'0x{address:08x} {name}\n'
+        out_symbols += [f'0x{address:08x} {name}\n']
 for name in replacement_symbols:
-    sys.exit(f'Attempted to REPLACE {name}, but it doesn\'t exist in symbols.txt!')
-replacement_symbols = backup
+    if name in remaining_symbols:
+        sys.exit(f'Attempted to REPLACE {name}, but it doesn\'t exist in symbols.txt!')
 
-out_replacements = '#include <Common.h>\n'
-out_replacements += '\n'
+out_replacements = [
+    '#include <Common.h>\n',
+    '\n',
+]
 for name in replacement_symbols:
-    out_replacements += f'extern int replaced_{name};\n'
-    out_replacements += f'extern int {name};\n'
+    out_replacements += [f'extern int replaced_{name};\n']
+    out_replacements += [f'extern int {name};\n']
     if name not in thunk_symbols:
-        out_replacements += f'PATCH_B(replaced_{name}, {name});\n'
+        out_replacements += [f'PATCH_B(replaced_{name}, {name});\n']
     else:
-        out_replacements += f'__attribute__((section("thunks"))) u32 {thunk_symbols[name]}[2];\n'
-        out_replacements += f'PATCH_B_THUNK(replaced_{name}, {name}, {thunk_symbols[name]});\n'
-    out_replacements += '\n'
+        out_replacements += [f'__attribute__((section("thunks"))) u32 {thunk_symbols[name]}[2];\n']
+        out_replacements += [f'PATCH_B_THUNK(replaced_{name}, {name}, {thunk_symbols[name]});\n']
+    out_replacements += ['\n']
 
 with open(args.out_symbols_path, 'w') as out_symbols_file:
-    out_symbols_file.write(out_symbols)
+    out_symbols_file.write(''.join(out_symbols))
 
 with open(args.out_replacements_path, 'w') as out_replacements_file:
-    out_replacements_file.write(out_replacements)
+    out_replacements_file.write(''.join(out_replacements))
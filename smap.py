@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+from bisect import bisect_left, bisect_right
+import lzma
+import random
+import struct
+import sys
+import time
+
+
+# Binary symbol map, big-endian so that the console can read it in place:
+# - header: magic, version, symbol count, offset of the name pool
+# - u32 addresses, sorted
+# - u32 offsets into the name pool, one per address
+# - name pool, NUL-terminated UTF-8 strings, each stored once
+SMAP_MAGIC = b'SMAP'
+SMAP_VERSION = 1
+HEADER = struct.Struct('>4sIII')
+
+def pack_smap(symbols):
+    symbols = sorted(symbols)
+    name_offsets = {}
+    names = bytearray()
+    offsets = []
+    for _, name in symbols:
+        offset = name_offsets.get(name)
+        if offset is None:
+            offset = len(names)
+            name_offsets[name] = offset
+            names += name.encode('utf-8') + b'\0'
+        offsets += [offset]
+    count = len(symbols)
+    return b''.join([
+        HEADER.pack(SMAP_MAGIC, SMAP_VERSION, count, HEADER.size + 0x8 * count),
+        struct.pack(f'>{count}I', *(address for address, _ in symbols)),
+        struct.pack(f'>{count}I', *offsets),
+        names,
+    ])
+
+def pack_text_smap(symbols):
+    return ''.join(f'0x{address:X} {name}\n' for address, name in sorted(symbols)).encode('utf-8')
+
+def unpack_text_smap(data):
+    symbols = []
+    for line in data.decode('utf-8').splitlines():
+        if not line:
+            continue
+        address, name = line.split(' ', 1)
+        symbols += [(int(address, 16), name)]
+    return sorted(symbols)
+
+class SymbolMap:
+    def __init__(self, data):
+        if data[:0x4] != SMAP_MAGIC:
+            symbols = unpack_text_smap(data)
+            self.addresses = [address for address, _ in symbols]
+            self.names = [name for _, name in symbols]
+            return
+
+        magic, version, count, names_offset = HEADER.unpack_from(data, 0x0)
+        if version != SMAP_VERSION:
+            sys.exit(f'Unsupported symbol map version {version}!')
+        self.addresses = list(struct.unpack_from(f'>{count}I', data, HEADER.size))
+        offsets = struct.unpack_from(f'>{count}I', data, HEADER.size + 0x4 * count)
+        names = {}
+        for offset in offsets:
+            if offset not in names:
+                end = data.index(b'\0', names_offset + offset)
+                names[offset] = data[names_offset + offset:end].decode('utf-8')
+        self.names = [names[offset] for offset in offsets]
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, 'rb') as in_file:
+            data = in_file.read()
+        if path.endswith('.lzma'):
+            data = lzma.decompress(data)
+        return cls(data)
+
+    def symbols(self):
+        return list(zip(self.addresses, self.names))
+
+    def find(self, address):
+        # The closest symbol at or below the address.
+        i = bisect_right(self.addresses, address) - 1
+        if i < 0:
+            return None
+        return self.addresses[i], self.names[i]
+
+    def lower_bound(self, address):
+        # Same as SP::MapFile::SymbolLowerBound: the closest symbol strictly below the address,
+        # falling back to the first one.
+        if not self.addresses:
+            return None
+        i = max(bisect_left(self.addresses, address) - 1, 0)
+        return self.addresses[i], self.names[i]
+
+def scan_text_smap(data, address):
+    # What the console did with the text format, kept as the benchmark baseline.
+    prev_symbol = None
+    for line in data.split(b'\n'):
+        if not line:
+            continue
+        symbol = (int(line[:0xa], 16), line[0xb:])
+        if prev_symbol is not None and symbol[0] >= address:
+            break
+        prev_symbol = symbol
+    return prev_symbol
+
+def benchmark(symbol_map, lookup_count):
+    symbols = symbol_map.symbols()
+    text_data = pack_text_smap(symbols)
+    binary_data = pack_smap(symbols)
+    for name, data in [('text', text_data), ('binary', binary_data)]:
+        compressed_size = len(lzma.compress(data, lzma.FORMAT_ALONE))
+        print(f'{name}: {len(data)} bytes, {compressed_size} bytes compressed')
+
+    if not symbols:
+        return
+    addresses = [random.randrange(symbols[0][0], symbols[-1][0] + 0x1000) for _ in range(lookup_count)]
+    start = time.perf_counter()
+    for address in addresses:
+        scan_text_smap(text_data, address)
+    text_time = time.perf_counter() - start
+    binary_map = SymbolMap(binary_data)
+    start = time.perf_counter()
+    for address in addresses:
+        binary_map.lower_bound(address)
+    binary_time = time.perf_counter() - start
+    print(f'text: {text_time / lookup_count * 1e6:.2f}us per lookup')
+    print(f'binary: {binary_time / lookup_count * 1e6:.2f}us per lookup')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('in_path', help='Text or binary symbol map, optionally LZMA-compressed')
+    parser.add_argument('addresses', nargs='*')
+    parser.add_argument('--binary', help='Write the map in the binary format to this path')
+    parser.add_argument('--text', help='Write the map in the text format to this path')
+    parser.add_argument('--benchmark', type=int, metavar='LOOKUPS', help='Compare both formats')
+    args = parser.parse_intermixed_args()
+
+    symbol_map = SymbolMap.from_path(args.in_path)
+    if args.binary is not None:
+        with open(args.binary, 'wb') as out_file:
+            out_file.write(pack_smap(symbol_map.symbols()))
+    if args.text is not None:
+        with open(args.text, 'wb') as out_file:
+            out_file.write(pack_text_smap(symbol_map.symbols()))
+    if args.benchmark is not None:
+        benchmark(symbol_map, args.benchmark)
+    for address in args.addresses:
+        address = int(address, 16)
+        symbol = symbol_map.find(address)
+        if symbol is None:
+            print(f'0x{address:08X} ?')
+        else:
+            print(f'0x{address:08X} {symbol[1]} [+0x{address - symbol[0]:X}]')
@@ -0,0 +1,474 @@
+import math
+import struct
+from collections import namedtuple
+
+
+POS_SCALE = 16
+POS_BITS = 25
+ROT_BITS = 12
+ROT_SCALE = ((1 << (ROT_BITS - 1)) - 1) * math.sqrt(2)
+SPEED_SCALE = 128
+SPEED_BITS = 16
+
+TIME_DELTA_LENGTH_BITS = 6
+POS_DELTA_LENGTH_BITS = 5
+ROT_DELTA_LENGTH_BITS = 4
+SPEED_DELTA_LENGTH_BITS = 5
+
+MAX_PLAYER_COUNT = 12
+
+PlayerState = namedtuple('PlayerState', [
+    'time',
+    'input_state',
+    'time_before_respawn',
+    'time_in_respawn',
+    'times_before_boost_end',
+    'pos',
+    'rot_index',
+    'rot_negative',
+    'rot',
+    'internal_speed',
+])
+
+
+class BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.size = 0
+
+    def write(self, value, bits):
+        self.value |= (value & ((1 << bits) - 1)) << self.size
+        self.size += bits
+
+    def write_signed(self, value, bits):
+        self.write(value & ((1 << bits) - 1), bits)
+
+    def write_delta(self, delta, length_bits):
+        # The length of the zigzagged delta, then its bits but the leading one.
+        zigzagged = zigzag(delta)
+        length = zigzagged.bit_length()
+        self.write(length, length_bits)
+        if length > 1:
+            self.write(zigzagged, length - 1)
+
+    def to_bytes(self):
+        return self.value.to_bytes((self.size + 7) // 8, 'little')
+
+class BitReader:
+    def __init__(self, data):
+        self.value = int.from_bytes(data, 'little')
+        self.size = len(data) * 8
+        self.offset = 0
+
+    def read(self, bits):
+        if self.offset + bits > self.size:
+            raise ValueError('Compact frame is truncated')
+        value = self.value >> self.offset & ((1 << bits) - 1)
+        self.offset += bits
+        return value
+
+    def read_signed(self, bits):
+        value = self.read(bits)
+        if value >> (bits - 1):
+            value -= 1 << bits
+        return value
+
+    def read_delta(self, length_bits):
+        length = self.read(length_bits)
+        if length == 0:
+            return 0
+        zigzagged = 1 << (length - 1)
+        if length > 1:
+            zigzagged |= self.read(length - 1)
+        return unzigzag(zigzagged)
+
+    def check_padding(self):
+        if self.size - self.offset >= 8 or self.value >> self.offset:
+            raise ValueError('Compact frame has trailing data')
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value):
+    return value >> 1 if value & 1 == 0 else -(value >> 1) - 1
+
+def quantize(value, scale, bits):
+    # Rounded half away from zero and saturated, like Rust's f64::round and float to int casts.
+    limit = (1 << (bits - 1)) - 1
+    if math.isnan(value):
+        return 0
+    scaled = abs(value) * scale
+    if scaled >= limit:
+        return limit if value >= 0 else -limit
+    quantized = math.floor(scaled)
+    if scaled - quantized >= 0.5:
+        quantized += 1
+    return quantized if value >= 0 else -quantized
+
+def quantize_rot(rot):
+    components = [rot['x'], rot['y'], rot['z'], rot['w']]
+    norm = math.sqrt(sum(c * c for c in components))
+    if not math.isfinite(norm) or norm == 0:
+        components, norm = [0.0, 0.0, 0.0, 1.0], 1.0
+    components = [c / norm for c in components]
+    index = max(range(4), key = lambda i: abs(components[i]))
+    negative = components[index] < 0
+    others = [c for i, c in enumerate(components) if i != index]
+    return index, negative, tuple(quantize(c, ROT_SCALE, ROT_BITS) for c in others)
+
+def quantize_player(player, time):
+    input_state = player['inputState']
+    rot_index, rot_negative, rot = quantize_rot(player['mainRot'])
+    times_before_boost_end = (list(player['timesBeforeBoostEnd']) + [0] * 3)[:3]
+    return PlayerState(
+        time = time,
+        input_state = (
+            input_state['accelerate'] << 0 |
+            input_state['brake'] << 1 |
+            input_state['item'] << 2 |
+            input_state['drift'] << 3 |
+            input_state['brakeDrift'] << 4 |
+            min(input_state['stickX'], 15) << 5 |
+            min(input_state['stickY'], 15) << 9 |
+            min(input_state['trick'], 7) << 13
+        ),
+        time_before_respawn = min(player['timeBeforeRespawn'], 255),
+        time_in_respawn = min(player['timeInRespawn'], 255),
+        times_before_boost_end = tuple(min(t, 255) for t in times_before_boost_end),
+        pos = tuple(quantize(player['pos'][c], POS_SCALE, POS_BITS) for c in 'xyz'),
+        rot_index = rot_index,
+        rot_negative = rot_negative,
+        rot = rot,
+        internal_speed = quantize(player['internalSpeed'], SPEED_SCALE, SPEED_BITS),
+    )
+
+def dequantize_player(state):
+    others = [c / ROT_SCALE for c in state.rot]
+    largest = math.sqrt(max(1.0 - sum(c * c for c in others), 0.0))
+    others.insert(state.rot_index, -largest if state.rot_negative else largest)
+    return {
+        'inputState': {
+            'accelerate': bool(state.input_state >> 0 & 1),
+            'brake': bool(state.input_state >> 1 & 1),
+            'item': bool(state.input_state >> 2 & 1),
+            'drift': bool(state.input_state >> 3 & 1),
+            'brakeDrift': bool(state.input_state >> 4 & 1),
+            'stickX': state.input_state >> 5 & 0xf,
+            'stickY': state.input_state >> 9 & 0xf,
+            'trick': state.input_state >> 13 & 0x7,
+        },
+        'timeBeforeRespawn': state.time_before_respawn,
+        'timeInRespawn': state.time_in_respawn,
+        'timesBeforeBoostEnd': list(state.times_before_boost_end),
+        'pos': dict(zip('xyz', (c / POS_SCALE for c in state.pos))),
+        'mainRot': dict(zip('xyzw', others)),
+        'internalSpeed': state.internal_speed / SPEED_SCALE,
+    }
+
+def write_timers(writer, state):
+    respawn = state.time_before_respawn != 0 or state.time_in_respawn != 0
+    writer.write(respawn, 1)
+    if respawn:
+        writer.write(state.time_before_respawn, 8)
+        writer.write(state.time_in_respawn, 8)
+    for time in state.times_before_boost_end:
+        writer.write(time != 0, 1)
+        if time != 0:
+            writer.write(time, 8)
+
+def read_timers(reader):
+    time_before_respawn, time_in_respawn = 0, 0
+    if reader.read(1):
+        time_before_respawn = reader.read(8)
+        time_in_respawn = reader.read(8)
+    times_before_boost_end = tuple(reader.read(8) if reader.read(1) else 0 for _ in range(3))
+    return time_before_respawn, time_in_respawn, times_before_boost_end
+
+def write_rot(writer, state):
+    writer.write(state.rot_index, 2)
+    writer.write(state.rot_negative, 1)
+    for c in state.rot:
+        writer.write_signed(c, ROT_BITS)
+
+def read_rot(reader):
+    index = reader.read(2)
+    negative = bool(reader.read(1))
+    return index, negative, tuple(reader.read_signed(ROT_BITS) for _ in range(3))
+
+def encode_player(writer, state, base):
+    if base is None:
+        writer.write(state.time, 32)
+        writer.write(state.input_state, 16)
+        write_timers(writer, state)
+        for c in state.pos:
+            writer.write_signed(c, POS_BITS)
+        write_rot(writer, state)
+        writer.write_signed(state.internal_speed, SPEED_BITS)
+        return
+
+    writer.write_delta(state.time - base.time, TIME_DELTA_LENGTH_BITS)
+    input_changed = state.input_state != base.input_state
+    writer.write(input_changed, 1)
+    if input_changed:
+        writer.write(state.input_state, 16)
+    write_timers(writer, state)
+    for c, base_c in zip(state.pos, base.pos):
+        writer.write_delta(c - base_c, POS_DELTA_LENGTH_BITS)
+    same_axis = state.rot_index == base.rot_index and state.rot_negative == base.rot_negative
+    writer.write(same_axis, 1)
+    if same_axis:
+        for c, base_c in zip(state.rot, base.rot):
+            writer.write_delta(c - base_c, ROT_DELTA_LENGTH_BITS)
+    else:
+        write_rot(writer, state)
+    writer.write_delta(state.internal_speed - base.internal_speed, SPEED_DELTA_LENGTH_BITS)
+
+def decode_player(reader, base):
+    if base is None:
+        time = reader.read(32)
+        input_state = reader.read(16)
+        timers = read_timers(reader)
+        pos = tuple(reader.read_signed(POS_BITS) for _ in range(3))
+        rot = read_rot(reader)
+        internal_speed = reader.read_signed(SPEED_BITS)
+    else:
+        time = base.time + reader.read_delta(TIME_DELTA_LENGTH_BITS)
+        input_state = reader.read(16) if reader.read(1) else base.input_state
+        timers = read_timers(reader)
+        pos = tuple(base_c + reader.read_delta(POS_DELTA_LENGTH_BITS) for base_c in base.pos)
+        if reader.read(1):
+            rot_delta = [reader.read_delta(ROT_DELTA_LENGTH_BITS) for _ in range(3)]
+            rot = base.rot_index, base.rot_negative, tuple(map(sum, zip(base.rot, rot_delta)))
+        else:
+            rot = read_rot(reader)
+        internal_speed = base.internal_speed + reader.read_delta(SPEED_DELTA_LENGTH_BITS)
+    state = PlayerState(time, input_state, *timers, pos, *rot, internal_speed)
+    if not check_state(state):
+        raise ValueError('Compact frame value is out of range')
+    return state
+
+def check_state(state):
+    pos_limit = (1 << (POS_BITS - 1)) - 1
+    rot_limit = (1 << (ROT_BITS - 1)) - 1
+    speed_limit = (1 << (SPEED_BITS - 1)) - 1
+    return (0 <= state.time <= 0xffffffff and
+            all(abs(c) <= pos_limit for c in state.pos) and
+            all(abs(c) <= rot_limit for c in state.rot) and
+            abs(state.internal_speed) <= speed_limit)
+
+def encode_players(states, base_states = None):
+    if len(states) > MAX_PLAYER_COUNT:
+        raise ValueError('Too many players')
+    if base_states is not None and len(base_states) != len(states):
+        raise ValueError('The base frame has a different player count')
+    writer = BitWriter()
+    writer.write(len(states), 4)
+    for i, state in enumerate(states):
+        encode_player(writer, state, None if base_states is None else base_states[i])
+    return writer.to_bytes()
+
+def decode_players(data, base_states = None):
+    reader = BitReader(data)
+    player_count = reader.read(4)
+    if player_count > MAX_PLAYER_COUNT:
+        raise ValueError('Too many players')
+    if base_states is not None and len(base_states) != player_count:
+        raise ValueError('The base frame has a different player count')
+    states = []
+    for i in range(player_count):
+        states += [decode_player(reader, None if base_states is None else base_states[i])]
+    reader.check_padding()
+    return states
+
+
+# Protobuf wire format, only what RaceServerFrame and RaceServerCompactFrame need.
+
+def encode_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def decode_varint(data, offset):
+    value = 0
+    for shift in range(0, 64, 7):
+        if offset >= len(data):
+            raise ValueError('Truncated varint')
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+    raise ValueError('Varint is too long')
+
+def iter_fields(data):
+    offset = 0
+    while offset < len(data):
+        key, offset = decode_varint(data, offset)
+        tag, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, offset = decode_varint(data, offset)
+        elif wire_type == 2 or wire_type == 5:
+            size = 4
+            if wire_type == 2:
+                size, offset = decode_varint(data, offset)
+            value = data[offset:offset + size]
+            if len(value) != size:
+                raise ValueError('Truncated field')
+            offset += size
+        else:
+            raise ValueError(f'Unsupported wire type {wire_type}')
+        yield tag, wire_type, value
+
+def decode_packed_varints(data):
+    values, offset = [], 0
+    while offset < len(data):
+        value, offset = decode_varint(data, offset)
+        values += [value]
+    return values
+
+def decode_u32s(wire_type, value):
+    return decode_packed_varints(value) if wire_type == 2 else [value]
+
+def decode_message(data, fields):
+    # fields maps tags to (name, kind, repeated), kind is 'uint32', 'bool', 'float', 'bytes' or a
+    # nested field map.
+    message = {name: [] for name, _, repeated in fields.values() if repeated}
+    for tag, wire_type, value in iter_fields(data):
+        if tag not in fields:
+            continue
+        name, kind, repeated = fields[tag]
+        if kind == 'float':
+            wire_types = [5]
+        elif kind == 'bytes' or isinstance(kind, dict):
+            wire_types = [2]
+        else:
+            wire_types = [0, 2] if repeated else [0]
+        if wire_type not in wire_types:
+            raise ValueError(f'Wrong wire type for {name}')
+        if kind == 'float':
+            values = [struct.unpack('<f', value)[0]]
+        elif kind == 'bytes':
+            values = [bytes(value)]
+        elif isinstance(kind, dict):
+            values = [decode_message(value, kind)]
+        else:
+            values = decode_u32s(wire_type, value)
+            if kind == 'bool':
+                values = [bool(v) for v in values]
+        if repeated:
+            message[name] += values
+        else:
+            message[name] = values[-1]
+    return message
+
+def encode_message(message, fields):
+    out = bytearray()
+    for tag, (name, kind, repeated) in sorted(fields.items()):
+        if name not in message:
+            continue
+        values = message[name] if repeated else [message[name]]
+        if kind == 'float':
+            for value in values:
+                out += encode_varint(tag << 3 | 5) + struct.pack('<f', value)
+        elif kind == 'bytes' or isinstance(kind, dict):
+            for value in values:
+                if isinstance(kind, dict):
+                    value = encode_message(value, kind)
+                out += encode_varint(tag << 3 | 2) + encode_varint(len(value)) + value
+        elif repeated:
+            # Packed, like nanopb writes repeated scalars.
+            if values:
+                packed = b''.join(encode_varint(int(value)) for value in values)
+                out += encode_varint(tag << 3 | 2) + encode_varint(len(packed)) + packed
+        else:
+            out += encode_varint(tag << 3 | 0) + encode_varint(int(values[0]))
+    return bytes(out)
+
+input_state_fields = {
+    1: ('accelerate', 'bool', False),
+    2: ('brake', 'bool', False),
+    3: ('item', 'bool', False),
+    4: ('drift', 'bool', False),
+    5: ('brakeDrift', 'bool', False),
+    6: ('stickX', 'uint32', False),
+    7: ('stickY', 'uint32', False),
+    8: ('trick', 'uint32', False),
+}
+vec3_fields = {
+    1: ('x', 'float', False),
+    2: ('y', 'float', False),
+    3: ('z', 'float', False),
+}
+quat_fields = {
+    1: ('x', 'float', False),
+    2: ('y', 'float', False),
+    3: ('z', 'float', False),
+    4: ('w', 'float', False),
+}
+player_frame_fields = {
+    1: ('inputState', input_state_fields, False),
+    2: ('timeBeforeRespawn', 'uint32', False),
+    3: ('timeInRespawn', 'uint32', False),
+    4: ('timesBeforeBoostEnd', 'uint32', True),
+    5: ('pos', vec3_fields, False),
+    6: ('mainRot', quat_fields, False),
+    7: ('internalSpeed', 'float', False),
+}
+race_server_frame_fields = {
+    1: ('time', 'uint32', False),
+    2: ('playerTimes', 'uint32', True),
+    3: ('players', player_frame_fields, True),
+}
+race_server_compact_frame_fields = {
+    1: ('time', 'uint32', False),
+    2: ('baseTime', 'uint32', False),
+    3: ('players', 'bytes', False),
+}
+
+def decode_race_server_frame(data):
+    return decode_message(data, race_server_frame_fields)
+
+def encode_race_server_frame(frame):
+    return encode_message(frame, race_server_frame_fields)
+
+def decode_race_server_compact_frame(data):
+    return decode_message(data, race_server_compact_frame_fields)
+
+def encode_race_server_compact_frame(frame):
+    return encode_message(frame, race_server_compact_frame_fields)
+
+
+def encode_frame(frame, base = None):
+    # base is (time, states) of the last frame acknowledged by the client, or None for a keyframe.
+    if len(frame['players']) != len(frame['playerTimes']):
+        raise ValueError('The player and player time counts differ')
+    states = [quantize_player(*args) for args in zip(frame['players'], frame['playerTimes'])]
+    compact_frame = {
+        'time': frame['time'],
+        'players': encode_players(states, None if base is None else base[1]),
+    }
+    if base is not None:
+        compact_frame['baseTime'] = base[0]
+    return encode_race_server_compact_frame(compact_frame), states
+
+def decode_frame(data, bases):
+    # bases maps the times of the frames the client kept to their states.
+    compact_frame = decode_race_server_compact_frame(data)
+    if 'time' not in compact_frame or 'players' not in compact_frame:
+        raise ValueError('Missing required field')
+    base_states = None
+    if 'baseTime' in compact_frame:
+        base_states = bases.get(compact_frame['baseTime'])
+        if base_states is None:
+            raise KeyError(compact_frame['baseTime'])
+    states = decode_players(compact_frame['players'], base_states)
+    frame = {
+        'time': compact_frame['time'],
+        'playerTimes': [state.time for state in states],
+        'players': [dequantize_player(state) for state in states],
+    }
+    return frame, states
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import math
+import random
+import struct
+import sys
+
+from compactframe import *
+
+
+# The server deltas against frames the client acknowledged, as long as it still has them.
+SERVER_HISTORY = 32
+CLIENT_HISTORY = 16
+
+
+def read_recording(in_path):
+    # Recordings are the RaceServerFrame messages the gameserver sent, each prefixed with its size
+    # as a little-endian u32.
+    with open(in_path, 'rb') as in_file:
+        in_data = in_file.read()
+    offset = 0
+    while offset < len(in_data):
+        if offset + 4 > len(in_data):
+            sys.exit(f'{in_path} is truncated.')
+        size, = struct.unpack_from('<I', in_data, offset)
+        offset += 4
+        if offset + size > len(in_data):
+            sys.exit(f'{in_path} is truncated.')
+        yield decode_race_server_frame(in_data[offset:offset + size])
+        offset += size
+
+def synthesize(frame_count, player_count, rng):
+    # Karts going around an oval track at race speeds, with some steering noise, drifts, boosts
+    # and respawns.
+    players = []
+    for i in range(player_count):
+        players += [{
+            'angle': rng.uniform(0, 2 * math.pi),
+            'lane': rng.uniform(-600, 600),
+            'speed': rng.uniform(80, 90),
+            'stick': 7,
+            'drift': False,
+            'boost': 0,
+            'respawn': 0,
+        }]
+
+    for time in range(frame_count):
+        frame = {'time': time, 'playerTimes': [], 'players': []}
+        for player in players:
+            if player['respawn'] == 0 and rng.random() < 0.0005:
+                player['respawn'] = 190
+            if player['respawn'] > 0:
+                player['respawn'] -= 1
+            if rng.random() < 0.05:
+                player['stick'] = min(max(player['stick'] + rng.randint(-3, 3), 0), 14)
+            if rng.random() < 0.01:
+                player['drift'] = not player['drift']
+            if player['boost'] == 0 and rng.random() < 0.01:
+                player['boost'] = rng.choice([50, 70, 90])
+            player['boost'] = max(player['boost'] - 1, 0)
+            player['speed'] += rng.uniform(-0.5, 0.5) + (0.5 if player['boost'] else 0)
+            player['speed'] = min(max(player['speed'], 0), 119)
+            player['lane'] = min(max(player['lane'] + (player['stick'] - 7) * 2, -800), 800)
+
+            radius_x, radius_z = 20000 + player['lane'], 12000 + player['lane']
+            player['angle'] += player['speed'] / math.hypot(radius_x, radius_z) * math.sqrt(2)
+            angle = player['angle']
+            pos = {
+                'x': radius_x * math.cos(angle),
+                'y': 1500 + 400 * math.sin(3 * angle),
+                'z': radius_z * math.sin(angle),
+            }
+            yaw = math.atan2(radius_z * math.cos(angle), -radius_x * math.sin(angle))
+            yaw += (player['stick'] - 7) * 0.02 + (0.3 if player['drift'] else 0)
+            pitch = 0.05 * math.cos(3 * angle) + rng.uniform(-0.01, 0.01)
+            roll = rng.uniform(-0.02, 0.02)
+            cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+            cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+            cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+            rot = {
+                'x': cy * sp * cr + sy * cp * sr,
+                'y': sy * cp * cr - cy * sp * sr,
+                'z': cy * cp * sr - sy * sp * cr,
+                'w': cy * cp * cr + sy * sp * sr,
+            }
+            # Through f32, like the game sends them.
+            pos = {k: struct.unpack('<f', struct.pack('<f', v))[0] for k, v in pos.items()}
+            rot = {k: struct.unpack('<f', struct.pack('<f', v))[0] for k, v in rot.items()}
+            speed = struct.unpack('<f', struct.pack('<f', player['speed']))[0]
+
+            frame['playerTimes'] += [max(time - rng.randint(0, 6), 0)]
+            frame['players'] += [{
+                'inputState': {
+                    'accelerate': player['respawn'] == 0,
+                    'brake': False,
+                    'item': rng.random() < 0.01,
+                    'drift': player['drift'],
+                    'brakeDrift': False,
+                    'stickX': player['stick'],
+                    'stickY': 7,
+                    'trick': 0,
+                },
+                'timeBeforeRespawn': min(player['respawn'], 100),
+                'timeInRespawn': max(player['respawn'] - 100, 0),
+                'timesBeforeBoostEnd': [player['boost'], 0, 0],
+                'pos': pos,
+                'mainRot': rot,
+                'internalSpeed': speed,
+            }]
+        yield frame
+
+def rotation_error(a, b):
+    dot = sum(a[c] * b[c] for c in 'xyzw')
+    norm = math.sqrt(sum(a[c] * a[c] for c in 'xyzw') * sum(b[c] * b[c] for c in 'xyzw'))
+    return math.degrees(2 * math.acos(min(abs(dot) / norm, 1.0)))
+
+class Stats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return self.total / max(self.count, 1)
+
+class Client:
+    def __init__(self):
+        self.bases = {}
+        self.last_time = None
+        self.in_flight = []
+        self.acks = []
+        self.server_ack = None
+        self.server_history = {}
+
+def simulate(frames, args, rng):
+    clients = [Client() for _ in range(args.clients)]
+    down_latency = args.rtt // 2
+    up_latency = args.rtt - down_latency
+    full_size = Stats()
+    key_size = Stats()
+    delta_size = Stats()
+    pos_error, rot_error, speed_error = Stats(), Stats(), Stats()
+    mismatches = 0
+    missing_bases = 0
+    lost = 0
+    originals = {}
+
+    for i, frame in enumerate(frames):
+        originals[frame['time']] = frame
+        originals.pop(frame['time'] - SERVER_HISTORY - args.rtt - 1, None)
+        full_size.add(len(encode_race_server_frame(frame)))
+
+        for client in clients:
+            # Server side
+            while client.acks and client.acks[0][0] <= i:
+                client.server_ack = client.acks.pop(0)[1]
+            base = None
+            if client.server_ack in client.server_history:
+                base = client.server_ack, client.server_history[client.server_ack]
+            data, states = encode_frame(frame, base)
+            client.server_history[frame['time']] = states
+            client.server_history.pop(frame['time'] - SERVER_HISTORY, None)
+            (key_size if base is None else delta_size).add(len(data))
+            if rng.random() < args.loss:
+                lost += 1
+            else:
+                client.in_flight += [(i + down_latency, data, states)]
+
+            # Client side
+            while client.in_flight and client.in_flight[0][0] <= i:
+                _, data, expected_states = client.in_flight.pop(0)
+                try:
+                    decoded, states = decode_frame(data, client.bases)
+                except KeyError:
+                    missing_bases += 1
+                    continue
+                if client.last_time is not None and decoded['time'] <= client.last_time:
+                    continue
+                if states != expected_states:
+                    mismatches += 1
+                client.last_time = decoded['time']
+                client.bases[decoded['time']] = states
+                client.bases.pop(decoded['time'] - CLIENT_HISTORY, None)
+                original = originals[decoded['time']]
+                for player, decoded_player in zip(original['players'], decoded['players']):
+                    pos_error.add(max(abs(player['pos'][c] - decoded_player['pos'][c]) for c in 'xyz'))
+                    rot_error.add(rotation_error(player['mainRot'], decoded_player['mainRot']))
+                    speed_error.add(abs(player['internalSpeed'] - decoded_player['internalSpeed']))
+            # Frame 0 can't be told apart from no frame by the server, it is never a base.
+            if client.last_time:
+                client.acks += [(i + up_latency, client.last_time)]
+
+    compact_total = key_size.total + delta_size.total
+    compact_count = key_size.count + delta_size.count
+    print(f'Frames: {full_size.count}, clients: {args.clients}, rtt: {args.rtt} frames, '
+          f'loss: {args.loss:.1%} ({lost} frames lost)')
+    print(f'RaceServerFrame:               {full_size.mean():7.1f} bytes/frame')
+    print(f'RaceServerCompactFrame:        {compact_total / max(compact_count, 1):7.1f} bytes/frame '
+          f'({compact_total / max(compact_count, 1) / max(full_size.mean(), 1):.1%})')
+    print(f'    keyframes:                 {key_size.mean():7.1f} bytes/frame ({key_size.count})')
+    print(f'    delta frames:              {delta_size.mean():7.1f} bytes/frame ({delta_size.count})')
+    print(f'Frames dropped (missing base): {missing_bases}')
+    print(f'State mismatches:              {mismatches}')
+    print(f'Position error:                {pos_error.mean():.4f} mean, {pos_error.max:.4f} max (units)')
+    print(f'Rotation error:                {rot_error.mean():.4f} mean, {rot_error.max:.4f} max (degrees)')
+    print(f'Speed error:                   {speed_error.mean():.5f} mean, {speed_error.max:.5f} max')
+    return mismatches == 0
+
+
+parser = ArgumentParser()
+parser.add_argument('inputs', nargs = '*', help = 'Recordings of RaceServerFrame streams')
+parser.add_argument('--synthetic', type = int, metavar = 'FRAMES',
+                    help = 'Simulate a generated stream instead of recordings')
+parser.add_argument('--players', type = int, default = 12)
+parser.add_argument('--clients', type = int, default = 4)
+parser.add_argument('--rtt', type = int, default = 8, help = 'Round trip time in frames')
+parser.add_argument('--loss', type = float, default = 0.02, help = 'Packet loss rate')
+parser.add_argument('--seed', type = int, default = 0)
+args = parser.parse_args()
+
+if args.synthetic is None and not args.inputs:
+    sys.exit('No recordings and no synthetic stream.')
+if not 1 <= args.players <= MAX_PLAYER_COUNT:
+    sys.exit(f'The player count must be between 1 and {MAX_PLAYER_COUNT}.')
+
+rng = random.Random(args.seed)
+ok = True
+if args.synthetic is not None:
+    print(f'Synthetic stream with {args.players} players')
+    ok &= simulate(synthesize(args.synthetic, args.players, rng), args, rng)
+for in_path in args.inputs:
+    print(in_path)
+    ok &= simulate(read_recording(in_path), args, rng)
+if not ok:
+    sys.exit('Decoded states differ from the encoded ones.')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+
+# This runs once per build edge, so it only imports modules that are built into the interpreter
+# (socket and json alone would double its startup time).
+import _socket
+import os
+import sys
+import time
+
+
+CONNECT_TIMEOUT = 5.0
+
+def connect(socket_path):
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+def start_server(socket_path):
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.posix_spawn(
+        sys.executable,
+        [sys.executable, server_path, socket_path],
+        os.environ,
+        file_actions = [
+            (os.POSIX_SPAWN_DUP2, devnull, 0),
+            (os.POSIX_SPAWN_DUP2, devnull, 1),
+            (os.POSIX_SPAWN_DUP2, devnull, 2),
+        ],
+        setsid = True,
+    )
+    os.close(devnull)
+
+def run_locally(argv):
+    os.execv(sys.executable, [sys.executable, *argv])
+
+def pack_request(argv):
+    # NUL-separated fields: the working directory, the argument count, the arguments and the
+    # environment, preceded by the total size.
+    fields = [
+        os.getcwd(),
+        str(len(argv)),
+        *argv,
+        *[f'{key}={val}' for key, val in os.environ.items()],
+    ]
+    payload = '\0'.join(fields).encode('utf-8', 'surrogateescape')
+    return len(payload).to_bytes(8, 'little') + payload
+
+def run(socket_path, argv):
+    client = connect(socket_path)
+    if client is None:
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok = True)
+        start_server(socket_path)
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while client is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            client = connect(socket_path)
+        if client is None:
+            run_locally(argv)
+
+    request = pack_request(argv)
+    # The job writes straight to our stdin, stdout and stderr.
+    fds = b''.join(fd.to_bytes(4, sys.byteorder, signed = True) for fd in [0, 1, 2])
+    response = b''
+    try:
+        size = client.sendmsg([request], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+        if size < len(request):
+            client.sendall(request[size:])
+        while not response.endswith(b'\n'):
+            chunk = client.recv(0x100)
+            if not chunk:
+                break
+            response += chunk
+    except OSError:
+        pass
+    client.close()
+    if not response.endswith(b'\n'):
+        # The server went away before the job finished, run it again here.
+        run_locally(argv)
+    code = int(response)
+    sys.exit(code if code >= 0 else 128 - code)
+
+if len(sys.argv) < 3:
+    sys.exit(f'Usage: {sys.argv[0]} <socket path> <script> [args...]')
+run(sys.argv[1], sys.argv[2:])
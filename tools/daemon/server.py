@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import array
+import fcntl
+import os
+import runpy
+import selectors
+import signal
+import socket
+import sys
+import traceback
+
+
+# Imported once here so that every job forked from the server starts with them loaded.
+PRELOADED_MODULES = [
+    'argparse',
+    'concurrent.futures',
+    'copy',
+    'dataclasses',
+    'hashlib',
+    'itanium_demangler',
+    'json',
+    'json5',
+    'lzma',
+    'mmap',
+    're',
+    'struct',
+]
+
+MAX_CHUNK_SIZE = 0x10000
+REQUEST_TIMEOUT = 5.0
+
+def preload_modules():
+    for name in PRELOADED_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+def run_job(request, fds, server_fds):
+    # Runs in the forked child: behave like `python script args...` started by ninja.
+    # In its own process group, so that it can be killed along with the processes it starts.
+    os.setpgid(0, 0)
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for fd in server_fds:
+        os.close(fd)
+    for fd, target_fd in zip(fds, [0, 1, 2]):
+        os.dup2(fd, target_fd)
+        os.close(fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    script = request['argv'][0]
+    sys.argv = list(request['argv'])
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    code = 0
+    try:
+        runpy.run_path(script, run_name = '__main__')
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file = sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Hide the server and runpy frames from the traceback.
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != os.path.abspath(script):
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code & 0xff)
+
+def unpack_request(payload):
+    fields = payload.decode('utf-8', 'surrogateescape').split('\0')
+    argc = int(fields[1])
+    return {
+        'cwd': fields[0],
+        'argv': fields[2:2 + argc],
+        'env': dict(field.split('=', 1) for field in fields[2 + argc:] if '=' in field),
+    }
+
+def recv_request(conn):
+    data = b''
+    fds = array.array('i')
+    size = None
+    while size is None or len(data) < 0x8 + size:
+        chunk, ancdata, _, _ = conn.recvmsg(MAX_CHUNK_SIZE, socket.CMSG_LEN(3 * fds.itemsize))
+        if not chunk:
+            break
+        data += chunk
+        for level, kind, cmsg_data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(cmsg_data[:len(cmsg_data) - len(cmsg_data) % fds.itemsize])
+        if size is None and len(data) >= 0x8:
+            size = int.from_bytes(data[:0x8], 'little')
+    if size is None or len(data) != 0x8 + size or len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        return None, None
+    return unpack_request(data[0x8:]), list(fds)
+
+def serve(socket_path, idle_timeout):
+    # Only one server per socket, concurrent clients may try to start several.
+    lock_file = open(socket_path + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+
+    preload_modules()
+    script_mtime = os.stat(__file__).st_mtime
+
+    # Children are reaped from the event loop, woken up through a pipe on SIGCHLD.
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+
+    jobs = {}
+    is_stopping = False
+    while True:
+        events = selector.select(idle_timeout if not jobs else None)
+        if not events and not jobs:
+            is_stopping = True
+        for key, _ in events:
+            if key.fileobj is server:
+                conn, _ = server.accept()
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    request, fds = recv_request(conn)
+                except (OSError, ValueError):
+                    request = None
+                if request is None:
+                    conn.close()
+                    continue
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    conn.close()
+                    run_job(request, fds, [wakeup_r, wakeup_w, selector.fileno(), lock_file.fileno()])
+                # Also set here, in case the client hangs up before the job got to it.
+                try:
+                    os.setpgid(pid, pid)
+                except OSError:
+                    pass
+                for fd in fds:
+                    os.close(fd)
+                jobs[pid] = conn
+                # The client sends nothing else, the connection only becomes readable when it
+                # hangs up.
+                selector.register(conn, selectors.EVENT_READ, pid)
+            elif key.data is not None:
+                # Ninja was interrupted and killed the client, the job must not write its outputs
+                # after ninja removed them.
+                selector.unregister(key.fileobj)
+                try:
+                    os.killpg(key.data, signal.SIGKILL)
+                except OSError:
+                    pass
+            else:
+                try:
+                    os.read(wakeup_r, 0x1000)
+                except BlockingIOError:
+                    pass
+        while jobs:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            conn = jobs.pop(pid, None)
+            if conn is None:
+                continue
+            try:
+                selector.unregister(conn)
+            except KeyError:
+                pass
+            code = os.waitstatus_to_exitcode(status)
+            try:
+                conn.sendall(f'{code}\n'.encode('ascii'))
+            except OSError:
+                pass
+            conn.close()
+        # Restart on the next build if this file was edited.
+        try:
+            if os.stat(__file__).st_mtime != script_mtime:
+                is_stopping = True
+        except OSError:
+            is_stopping = True
+        if is_stopping:
+            if server is not None:
+                selector.unregister(server)
+                server.close()
+                server = None
+                os.unlink(socket_path)
+                lock_file.close()
+            if not jobs:
+                break
+
+parser = ArgumentParser()
+parser.add_argument('socket_path')
+parser.add_argument('--idle-timeout', type = float, default = 120.0)
+args = parser.parse_args()
+
+serve(args.socket_path, args.idle_timeout)
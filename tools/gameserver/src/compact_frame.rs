@@ -0,0 +1,230 @@
+// The compact race frame encoding, tools/compactframe/compactframe.py is the reference and
+// CompactFrameDecoder in the payload the decoder.
+
+use crate::room_protocol::{PlayerFrame, RaceServerCompactFrame, RaceServerFrame};
+
+const POS_SCALE: f64 = 16.0;
+const POS_BITS: u32 = 25;
+const ROT_BITS: u32 = 12;
+const ROT_SCALE: f64 = ((1 << (ROT_BITS - 1)) - 1) as f64 * std::f64::consts::SQRT_2;
+const SPEED_SCALE: f64 = 128.0;
+const SPEED_BITS: u32 = 16;
+
+const TIME_DELTA_LENGTH_BITS: u32 = 6;
+const POS_DELTA_LENGTH_BITS: u32 = 5;
+const ROT_DELTA_LENGTH_BITS: u32 = 4;
+const SPEED_DELTA_LENGTH_BITS: u32 = 5;
+
+#[derive(Clone, Debug, PartialEq)]
+pub struct PlayerState {
+    time: u32,
+    input_state: u16,
+    time_before_respawn: u8,
+    time_in_respawn: u8,
+    times_before_boost_end: [u8; 3],
+    pos: [i32; 3],
+    rot_index: u8,
+    rot_negative: bool,
+    rot: [i32; 3],
+    internal_speed: i32,
+}
+
+#[derive(Default)]
+struct BitWriter {
+    bytes: Vec<u8>,
+    size: u32,
+}
+
+impl BitWriter {
+    fn write(&mut self, value: u64, bits: u32) {
+        for i in 0..bits {
+            if self.size % 8 == 0 {
+                self.bytes.push(0);
+            }
+            if value >> i & 1 != 0 {
+                *self.bytes.last_mut().unwrap() |= 1 << (self.size % 8);
+            }
+            self.size += 1;
+        }
+    }
+
+    fn write_signed(&mut self, value: i32, bits: u32) {
+        self.write(value as u64, bits);
+    }
+
+    fn write_delta(&mut self, delta: i64, length_bits: u32) {
+        // The length of the zigzagged delta, then its bits but the leading one.
+        let zigzagged = if delta >= 0 {
+            (delta as u64) << 1
+        } else {
+            ((-delta as u64) << 1) - 1
+        };
+        let length = u64::BITS - zigzagged.leading_zeros();
+        self.write(length as u64, length_bits);
+        if length > 1 {
+            self.write(zigzagged, length - 1);
+        }
+    }
+}
+
+// Rounded half away from zero and saturated to the symmetric range.
+fn quantize(value: f64, scale: f64, bits: u32) -> i32 {
+    let limit = (1 << (bits - 1)) - 1;
+    if value.is_nan() {
+        return 0;
+    }
+    let scaled = value.abs() * scale;
+    let quantized = if scaled >= limit as f64 {
+        limit
+    } else {
+        scaled.round() as i32
+    };
+    if value >= 0.0 {
+        quantized
+    } else {
+        -quantized
+    }
+}
+
+fn quantize_rot(x: f32, y: f32, z: f32, w: f32) -> (u8, bool, [i32; 3]) {
+    let mut components = [x as f64, y as f64, z as f64, w as f64];
+    let mut norm = components.iter().fold(0.0, |sum, c| sum + c * c).sqrt();
+    if !norm.is_finite() || norm == 0.0 {
+        components = [0.0, 0.0, 0.0, 1.0];
+        norm = 1.0;
+    }
+    for c in &mut components {
+        *c /= norm;
+    }
+    let mut index = 0;
+    for i in 1..4 {
+        if components[i].abs() > components[index].abs() {
+            index = i;
+        }
+    }
+    let mut rot = [0; 3];
+    for (c, other) in rot.iter_mut().zip((0..4).filter(|i| *i != index)) {
+        *c = quantize(components[other], ROT_SCALE, ROT_BITS);
+    }
+    (index as u8, components[index] < 0.0, rot)
+}
+
+fn quantize_player(player: &PlayerFrame, time: u32) -> PlayerState {
+    let input_state = player.input_state.clone().unwrap_or_default();
+    let pos = player.pos.clone().unwrap_or_default();
+    let main_rot = player.main_rot.clone().unwrap_or_default();
+    let (rot_index, rot_negative, rot) =
+        quantize_rot(main_rot.x, main_rot.y, main_rot.z, main_rot.w);
+    let mut times_before_boost_end = [0; 3];
+    for (t, time) in times_before_boost_end.iter_mut().zip(&player.times_before_boost_end) {
+        *t = (*time).min(255) as u8;
+    }
+    PlayerState {
+        time,
+        input_state: (input_state.accelerate as u16)
+            | (input_state.brake as u16) << 1
+            | (input_state.item as u16) << 2
+            | (input_state.drift as u16) << 3
+            | (input_state.brake_drift as u16) << 4
+            | (input_state.stick_x.min(15) as u16) << 5
+            | (input_state.stick_y.min(15) as u16) << 9
+            | (input_state.trick.min(7) as u16) << 13,
+        time_before_respawn: player.time_before_respawn.min(255) as u8,
+        time_in_respawn: player.time_in_respawn.min(255) as u8,
+        times_before_boost_end,
+        pos: [pos.x, pos.y, pos.z].map(|c| quantize(c as f64, POS_SCALE, POS_BITS)),
+        rot_index,
+        rot_negative,
+        rot,
+        internal_speed: quantize(player.internal_speed as f64, SPEED_SCALE, SPEED_BITS),
+    }
+}
+
+fn write_timers(writer: &mut BitWriter, state: &PlayerState) {
+    let respawn = state.time_before_respawn != 0 || state.time_in_respawn != 0;
+    writer.write(respawn as u64, 1);
+    if respawn {
+        writer.write(state.time_before_respawn as u64, 8);
+        writer.write(state.time_in_respawn as u64, 8);
+    }
+    for time in state.times_before_boost_end {
+        writer.write((time != 0) as u64, 1);
+        if time != 0 {
+            writer.write(time as u64, 8);
+        }
+    }
+}
+
+fn write_rot(writer: &mut BitWriter, state: &PlayerState) {
+    writer.write(state.rot_index as u64, 2);
+    writer.write(state.rot_negative as u64, 1);
+    for c in state.rot {
+        writer.write_signed(c, ROT_BITS);
+    }
+}
+
+fn encode_player(writer: &mut BitWriter, state: &PlayerState, base: Option<&PlayerState>) {
+    let Some(base) = base else {
+        writer.write(state.time as u64, 32);
+        writer.write(state.input_state as u64, 16);
+        write_timers(writer, state);
+        for c in state.pos {
+            writer.write_signed(c, POS_BITS);
+        }
+        write_rot(writer, state);
+        writer.write_signed(state.internal_speed, SPEED_BITS);
+        return;
+    };
+
+    writer.write_delta(state.time as i64 - base.time as i64, TIME_DELTA_LENGTH_BITS);
+    let input_changed = state.input_state != base.input_state;
+    writer.write(input_changed as u64, 1);
+    if input_changed {
+        writer.write(state.input_state as u64, 16);
+    }
+    write_timers(writer, state);
+    for (c, base_c) in state.pos.iter().zip(&base.pos) {
+        writer.write_delta(*c as i64 - *base_c as i64, POS_DELTA_LENGTH_BITS);
+    }
+    let same_axis = state.rot_index == base.rot_index && state.rot_negative == base.rot_negative;
+    writer.write(same_axis as u64, 1);
+    if same_axis {
+        for (c, base_c) in state.rot.iter().zip(&base.rot) {
+            writer.write_delta(*c as i64 - *base_c as i64, ROT_DELTA_LENGTH_BITS);
+        }
+    } else {
+        write_rot(writer, state);
+    }
+    writer.write_delta(
+        state.internal_speed as i64 - base.internal_speed as i64,
+        SPEED_DELTA_LENGTH_BITS,
+    );
+}
+
+pub fn quantize_frame(frame: &RaceServerFrame) -> Vec<PlayerState> {
+    frame
+        .players
+        .iter()
+        .zip(&frame.player_times)
+        .map(|(player, time)| quantize_player(player, *time))
+        .collect()
+}
+
+// base is the time and states of the last frame acknowledged by the client, without one the
+// frame is a keyframe.
+pub fn encode_frame(
+    time: u32,
+    states: &[PlayerState],
+    base: Option<(u32, &[PlayerState])>,
+) -> RaceServerCompactFrame {
+    let mut writer = BitWriter::default();
+    writer.write(states.len() as u64, 4);
+    for (i, state) in states.iter().enumerate() {
+        encode_player(&mut writer, state, base.map(|(_, base_states)| &base_states[i]));
+    }
+    RaceServerCompactFrame {
+        time,
+        base_time: base.map(|(base_time, _)| base_time),
+        players: writer.bytes,
+    }
+}
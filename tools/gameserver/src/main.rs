@@ -1,3 +1,4 @@
+mod compact_frame;
 mod matchmaking;
 mod room;
 mod unreliable_socket;
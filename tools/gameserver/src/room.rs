@@ -1,11 +1,19 @@
+use std::collections::VecDeque;
+use std::fs::File;
+use std::io::{BufWriter, Write};
+use std::path::Path;
+use std::time::{SystemTime, UNIX_EPOCH};
+
 use anyhow::{Context, Result};
 use libhydrogen::secretbox;
+use prost::Message;
 use rand::Rng;
 use slab::Slab;
 use tokio::net::UdpSocket;
 use tokio::sync::{broadcast, mpsc};
 use tokio::task::JoinHandle;
 
+use crate::compact_frame::{self, PlayerState};
 use crate::matchmaking;
 use crate::room_protocol::room_event::Properties;
 use crate::room_protocol::*;
@@ -29,6 +37,11 @@ pub struct Room {
 impl Room {
     const MAX_CLIENT_COUNT: usize = 32;
     const MAX_PLAYER_COUNT: usize = 12;
+    const FRAME_ENCODING_SETTING: usize = 6;
+    const FRAME_ENCODING_COMPACT: u32 = 1;
+    // Compact frames are deltas against the last frame the client acknowledged, as long as it is
+    // still in the history.
+    const FRAME_HISTORY_SIZE: usize = 32;
 
     pub fn new(
         connect_rx: mpsc::Receiver<(RoomAsyncStream, room_request::Join)>,
@@ -155,6 +168,16 @@ impl Room {
             .map(|(_, client)| Connection::new(client.read_key.clone(), client.write_key.clone()))
             .collect();
         let mut unreliable_socket = UnreliableSocket::new(socket, context, connections);
+        let client_keys: Vec<_> = self.clients.iter().map(|(client_key, _)| client_key).collect();
+        let is_compact = self
+            .settings
+            .as_ref()
+            .and_then(|settings| settings.get(Self::FRAME_ENCODING_SETTING))
+            .map_or(false, |encoding| *encoding == Self::FRAME_ENCODING_COMPACT);
+        let mut recording = match std::env::var_os("SP_RACE_RECORDING_DIR") {
+            Some(dir) => Some(Self::create_recording(Path::new(&dir))?),
+            None => None,
+        };
 
         let mut pending_clients = (0..self.clients.len()).collect::<Vec<_>>();
         while !pending_clients.is_empty() {
@@ -186,6 +209,8 @@ impl Room {
             }
         };
 
+        let mut client_acks = vec![0; client_keys.len()];
+        let mut history: VecDeque<(u32, Vec<PlayerState>)> = VecDeque::new();
         for time in 0.. {
             let Some((client_key, request)) = self.read_rx.recv().await else {return Ok(())};
             let Some(request) = request.request else { continue }; // TODO handle
@@ -197,6 +222,9 @@ impl Room {
                 continue; // TODO handle
             }
             tracing::debug!("{:?} {:?}", client_key, race);
+            if let Some(index) = client_keys.iter().position(|key| *key == client_key) {
+                client_acks[index] = race.server_time;
+            }
             for ((player_id, _), player_frame) in
                 self.client_players(client_key).zip(race.players.into_iter())
             {
@@ -211,14 +239,47 @@ impl Room {
                 players,
             };
             tracing::debug!("{:?}", server_frame);
+            if let Some(recording) = &mut recording {
+                let message = server_frame.encode_to_vec();
+                recording.write_all(&(message.len() as u32).to_le_bytes())?;
+                recording.write_all(&message)?;
+            }
+            if !is_compact {
+                for index in 0..self.clients.len() {
+                    unreliable_socket.write(index, &server_frame).await?;
+                }
+                continue;
+            }
+
+            let states = compact_frame::quantize_frame(&server_frame);
             for index in 0..self.clients.len() {
-                unreliable_socket.write(index, &server_frame).await?;
+                // Frame 0 can't be told apart from no frame, it is never a base.
+                let base = history
+                    .iter()
+                    .find(|(base_time, _)| *base_time != 0 && *base_time == client_acks[index])
+                    .map(|(base_time, base_states)| (*base_time, base_states.as_slice()));
+                let server_compact_frame = compact_frame::encode_frame(time, &states, base);
+                unreliable_socket.write(index, &server_compact_frame).await?;
+            }
+            if history.len() == Self::FRAME_HISTORY_SIZE {
+                history.pop_front();
             }
+            history.push_back((time, states));
         }
 
         Ok(())
     }
 
+    // Recordings are the RaceServerFrame messages, each prefixed with its size as a little-endian
+    // u32. tools/compactframe/simulate.py reads them.
+    fn create_recording(dir: &Path) -> Result<BufWriter<File>> {
+        let timestamp = SystemTime::now().duration_since(UNIX_EPOCH)?.as_secs();
+        let suffix: u32 = rand::thread_rng().gen();
+        let path = dir.join(format!("race-{timestamp}-{suffix:08x}.bin"));
+        let file = File::create(&path).with_context(|| format!("Failed to create {path:?}"))?;
+        Ok(BufWriter::new(file))
+    }
+
     fn handle_lobby_connect(
         &mut self,
         mut stream: RoomAsyncStream,
@@ -271,6 +332,9 @@ impl Room {
             to_write.push(event);
         }
         let settings = self.settings.clone().unwrap_or(join.settings);
+        if is_host {
+            self.settings = Some(settings.clone());
+        }
         let event = room_event::Settings {
             settings,
         };
@@ -391,6 +455,9 @@ impl Room {
         }
 
         let client = self.clients.remove(client_key);
+        if self.clients.is_empty() {
+            self.settings = None;
+        }
         if let Some(matchmaking_state) = &self.matchmaking_state {
             let _ = matchmaking_state.ws_conn.send(matchmaking::Message::Update {
                 client_id: client.client_id.clone(),
@@ -0,0 +1,300 @@
+#include "Room.pb.h"
+
+#include <vendor/nanopb/pb_decode.h>
+#include <vendor/nanopb/pb_encode.h>
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#if defined(__x86_64__) || defined(__i386__)
+#include <x86intrin.h>
+#define HAS_CYCLES 1
+#else
+#define HAS_CYCLES 0
+#endif
+
+static unsigned iterations = 200000;
+
+static uint32_t rng_state = 0x12345678;
+
+static uint32_t rng(void) {
+    rng_state = rng_state * 1664525 + 1013904223;
+    return rng_state;
+}
+
+static float rng_float(float range) {
+    return ((float)(rng() >> 8) / (float)(1 << 24) * 2.0f - 1.0f) * range;
+}
+
+static void fill_player(PlayerFrame *player) {
+    player->inputState.accelerate = rng() & 1;
+    player->inputState.brake = rng() & 1;
+    player->inputState.item = rng() & 1;
+    player->inputState.drift = rng() & 1;
+    player->inputState.brakeDrift = rng() & 1;
+    player->inputState.stickX = rng() % 15;
+    player->inputState.stickY = rng() % 15;
+    player->inputState.trick = rng() % 5;
+    player->timeBeforeRespawn = rng() % 4 ? 0 : rng() % 200;
+    player->timeInRespawn = rng() % 4 ? 0 : rng() % 200;
+    player->timesBeforeBoostEnd_count = 3;
+    for (int i = 0; i < 3; i++) {
+        player->timesBeforeBoostEnd[i] = rng() % 2 ? 0 : rng() % 300;
+    }
+    player->pos.x = rng_float(30000.0f);
+    player->pos.y = rng_float(5000.0f);
+    player->pos.z = rng_float(30000.0f);
+    player->mainRot.x = rng_float(1.0f);
+    player->mainRot.y = rng_float(1.0f);
+    player->mainRot.z = rng_float(1.0f);
+    player->mainRot.w = rng_float(1.0f);
+    player->internalSpeed = rng_float(120.0f);
+}
+
+static void fill_server_frame(RaceServerFrame *frame) {
+    frame->time = rng() % 100000;
+    frame->playerTimes_count = 12;
+    frame->players_count = 12;
+    for (int i = 0; i < 12; i++) {
+        frame->playerTimes[i] = frame->time - rng() % 10;
+        fill_player(&frame->players[i]);
+    }
+}
+
+static void fill_race(RoomRequest_Race *race) {
+    race->time = rng() % 100000;
+    race->serverTime = race->time - rng() % 10;
+    race->players_count = 2;
+    for (int i = 0; i < 2; i++) {
+        fill_player(&race->players[i]);
+    }
+}
+
+static void fail(const char *message) {
+    fprintf(stderr, "%s\n", message);
+    exit(1);
+}
+
+struct timer {
+    struct timespec time;
+    unsigned long long cycles;
+};
+
+static struct timer timer_start(void) {
+    struct timer timer;
+    clock_gettime(CLOCK_MONOTONIC, &timer.time);
+#if HAS_CYCLES
+    timer.cycles = __rdtsc();
+#else
+    timer.cycles = 0;
+#endif
+    return timer;
+}
+
+static void timer_report(const char *name, struct timer start) {
+    struct timer end = timer_start();
+    double ns = (double)(end.time.tv_sec - start.time.tv_sec) * 1e9 +
+            (double)(end.time.tv_nsec - start.time.tv_nsec);
+    printf("%-40s %9.1f ns/frame", name, ns / iterations);
+    if (HAS_CYCLES) {
+        printf(" %9.1f cycles/frame", (double)(end.cycles - start.cycles) / iterations);
+    }
+    printf("\n");
+}
+
+static size_t encode_generic(pb_byte_t *buffer, size_t size, const RaceServerFrame *frame) {
+    pb_ostream_t stream = pb_ostream_from_buffer(buffer, size);
+    if (!pb_encode(&stream, RaceServerFrame_fields, frame)) {
+        fail(PB_GET_ERROR(&stream));
+    }
+    return stream.bytes_written;
+}
+
+static size_t encode_specialized(pb_byte_t *buffer, size_t size, const RaceServerFrame *frame) {
+    pb_ostream_t stream = pb_ostream_from_buffer(buffer, size);
+    if (!RaceServerFrame_encode_specialized(&stream, frame)) {
+        fail(PB_GET_ERROR(&stream));
+    }
+    return stream.bytes_written;
+}
+
+static void decode_generic(const pb_byte_t *buffer, size_t size, RaceServerFrame *frame) {
+    pb_istream_t stream = pb_istream_from_buffer(buffer, size);
+    if (!pb_decode(&stream, RaceServerFrame_fields, frame)) {
+        fail(PB_GET_ERROR(&stream));
+    }
+}
+
+static void decode_specialized(const pb_byte_t *buffer, size_t size, RaceServerFrame *frame) {
+    pb_istream_t stream = pb_istream_from_buffer(buffer, size);
+    if (!RaceServerFrame_decode_specialized(&stream, frame)) {
+        fail(PB_GET_ERROR(&stream));
+    }
+    if (stream.bytes_left != 0) {
+        fail("Specialized decoder did not consume the whole frame");
+    }
+}
+
+static bool frames_equal(const RaceServerFrame *a, const RaceServerFrame *b) {
+    pb_byte_t a_buffer[RaceServerFrame_size], b_buffer[RaceServerFrame_size];
+    size_t a_size = encode_generic(a_buffer, sizeof(a_buffer), a);
+    size_t b_size = encode_generic(b_buffer, sizeof(b_buffer), b);
+    return a_size == b_size && !memcmp(a_buffer, b_buffer, a_size);
+}
+
+// Checks the specialized encoders against pb_encode, including the way RaceClient wraps the race
+// into a RoomRequest.
+static void check_encode(void) {
+    for (int i = 0; i < 1000; i++) {
+        RaceServerFrame frame;
+        fill_server_frame(&frame);
+        frame.playerTimes_count = rng() % 13;
+        frame.players_count = rng() % 13;
+        pb_byte_t expected[RaceServerFrame_size], actual[RaceServerFrame_size];
+        size_t expected_size = encode_generic(expected, sizeof(expected), &frame);
+        size_t actual_size = encode_specialized(actual, sizeof(actual), &frame);
+        if (expected_size != actual_size || memcmp(expected, actual, expected_size)) {
+            fail("RaceServerFrame encoding differs from pb_encode");
+        }
+
+        RoomRequest request;
+        request.which_request = RoomRequest_race_tag;
+        fill_race(&request.request.race);
+        request.request.race.players_count = rng() % 3;
+        pb_byte_t request_expected[RoomRequest_size];
+        pb_ostream_t stream = pb_ostream_from_buffer(request_expected, sizeof(request_expected));
+        if (!pb_encode(&stream, RoomRequest_fields, &request)) {
+            fail(PB_GET_ERROR(&stream));
+        }
+        pb_byte_t race_buffer[RoomRequest_Race_size];
+        pb_ostream_t race_stream = pb_ostream_from_buffer(race_buffer, sizeof(race_buffer));
+        pb_byte_t request_actual[RoomRequest_size];
+        pb_ostream_t request_stream = pb_ostream_from_buffer(request_actual, sizeof(request_actual));
+        if (!RoomRequest_Race_encode_specialized(&race_stream, &request.request.race) ||
+                !pb_encode_tag(&request_stream, PB_WT_STRING, RoomRequest_race_tag) ||
+                !pb_encode_string(&request_stream, race_buffer, race_stream.bytes_written)) {
+            fail("RoomRequest_Race_encode_specialized failed");
+        }
+        if (stream.bytes_written != request_stream.bytes_written ||
+                memcmp(request_expected, request_actual, stream.bytes_written)) {
+            fail("RoomRequest encoding differs from pb_encode");
+        }
+    }
+}
+
+// A stream that is not a buffer, to go through the copies on the stack.
+static bool read_callback(pb_istream_t *stream, pb_byte_t *buf, size_t count) {
+    const pb_byte_t **source = stream->state;
+    memcpy(buf, *source, count);
+    *source += count;
+    return true;
+}
+
+static void check_decode(void) {
+    for (int i = 0; i < 1000; i++) {
+        RaceServerFrame frame, decoded;
+        fill_server_frame(&frame);
+        frame.playerTimes_count = rng() % 13;
+        frame.players_count = rng() % 13;
+        pb_byte_t buffer[RaceServerFrame_size + 16];
+        size_t size = encode_generic(buffer, sizeof(buffer), &frame);
+
+        memset(&decoded, 0xAA, sizeof(decoded));
+        decode_specialized(buffer, size, &decoded);
+        if (!frames_equal(&frame, &decoded)) {
+            fail("RaceServerFrame does not round-trip");
+        }
+
+        const pb_byte_t *source = buffer;
+        pb_istream_t stream = {&read_callback, &source, size};
+        memset(&decoded, 0xAA, sizeof(decoded));
+        if (!RaceServerFrame_decode_specialized(&stream, &decoded) || !frames_equal(&frame, &decoded)) {
+            fail("RaceServerFrame does not round-trip through a callback stream");
+        }
+
+        // An unknown field is not handled by the specialized decoder, pb_decode takes over.
+        buffer[size++] = 0x78;
+        buffer[size++] = 0x2A;
+        memset(&decoded, 0xAA, sizeof(decoded));
+        decode_specialized(buffer, size, &decoded);
+        if (!frames_equal(&frame, &decoded)) {
+            fail("RaceServerFrame does not round-trip through the fallback");
+        }
+    }
+
+    // Truncated frames are rejected by both.
+    RaceServerFrame frame, decoded;
+    fill_server_frame(&frame);
+    pb_byte_t buffer[RaceServerFrame_size];
+    size_t size = encode_generic(buffer, sizeof(buffer), &frame);
+    for (size_t i = 1; i < size; i += 7) {
+        pb_istream_t generic = pb_istream_from_buffer(buffer, size - i);
+        pb_istream_t specialized = pb_istream_from_buffer(buffer, size - i);
+        if (pb_decode(&generic, RaceServerFrame_fields, &decoded) !=
+                RaceServerFrame_decode_specialized(&specialized, &decoded)) {
+            fail("Truncated RaceServerFrame handled differently");
+        }
+    }
+}
+
+int main(int argc, char **argv) {
+    if (argc > 1) {
+        iterations = (unsigned)strtoul(argv[1], NULL, 0);
+    }
+
+    check_encode();
+    check_decode();
+
+#ifdef PB_ENCODE_ARRAYS_UNPACKED
+    printf("Arrays unpacked (like the server sends them)\n");
+#else
+    printf("Arrays packed\n");
+#endif
+
+    RaceServerFrame frames[16];
+    pb_byte_t buffers[16][RaceServerFrame_size];
+    size_t sizes[16];
+    size_t total = 0;
+    for (int i = 0; i < 16; i++) {
+        fill_server_frame(&frames[i]);
+        sizes[i] = encode_generic(buffers[i], sizeof(buffers[i]), &frames[i]);
+        total += sizes[i];
+    }
+    printf("RaceServerFrame with 12 players, %zu bytes on average\n", total / 16);
+
+    pb_byte_t out[RaceServerFrame_size];
+    volatile size_t sink = 0;
+    struct timer timer;
+
+    timer = timer_start();
+    for (unsigned i = 0; i < iterations; i++) {
+        sink += encode_generic(out, sizeof(out), &frames[i % 16]);
+    }
+    timer_report("pb_encode", timer);
+
+    timer = timer_start();
+    for (unsigned i = 0; i < iterations; i++) {
+        sink += encode_specialized(out, sizeof(out), &frames[i % 16]);
+    }
+    timer_report("RaceServerFrame_encode_specialized", timer);
+
+    RaceServerFrame decoded;
+    timer = timer_start();
+    for (unsigned i = 0; i < iterations; i++) {
+        decode_generic(buffers[i % 16], sizes[i % 16], &decoded);
+        sink += decoded.time;
+    }
+    timer_report("pb_decode", timer);
+
+    timer = timer_start();
+    for (unsigned i = 0; i < iterations; i++) {
+        decode_specialized(buffers[i % 16], sizes[i % 16], &decoded);
+        sink += decoded.time;
+    }
+    timer_report("RaceServerFrame_decode_specialized", timer);
+
+    (void)sink;
+    return 0;
+}
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import os
+import subprocess
+import sys
+import tempfile
+
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+nanopb_dir = os.path.join(root_dir, 'vendor', 'nanopb')
+protobuf_dir = os.path.join(root_dir, 'protobuf')
+
+parser = ArgumentParser()
+parser.add_argument('--cc', default = os.environ.get('CC', 'cc'))
+parser.add_argument('--cflags', default = '-O2')
+parser.add_argument('--iterations', type = int, default = 200000)
+args = parser.parse_args()
+
+with tempfile.TemporaryDirectory() as out_dir:
+    subprocess.run([
+        sys.executable,
+        os.path.join(nanopb_dir, 'generator', 'nanopb_generator.py'),
+        os.path.join(protobuf_dir, 'Login.proto'),
+        os.path.join(protobuf_dir, 'Room.proto'),
+        '-I', protobuf_dir,
+        '-L', '#include <vendor/nanopb/%s>',
+        '-D', out_dir,
+        '-q',
+    ], check = True)
+
+    sources = [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench.c'),
+        os.path.join(out_dir, 'Login.pb.c'),
+        os.path.join(out_dir, 'Room.pb.c'),
+        os.path.join(nanopb_dir, 'pb_common.c'),
+        os.path.join(nanopb_dir, 'pb_decode.c'),
+        os.path.join(nanopb_dir, 'pb_encode.c'),
+    ]
+    # The server encodes arrays unpacked, the game packs them.
+    for defines in [[], ['-DPB_ENCODE_ARRAYS_UNPACKED']]:
+        out_path = os.path.join(out_dir, 'bench')
+        subprocess.run([
+            args.cc,
+            *args.cflags.split(),
+            '-std=gnu11',
+            '-Wall',
+            '-Werror',
+            *defines,
+            '-I', root_dir,
+            '-I', nanopb_dir,
+            '-I', out_dir,
+            *sources,
+            '-o', out_path,
+        ], check = True)
+        result = subprocess.run([out_path, str(args.iterations)])
+        if result.returncode != 0:
+            sys.exit(f'Benchmark failed with exit code {result.returncode}.')
+        print()
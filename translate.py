@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+from bisect import bisect_right
+import sys
+
+from port import CHUNKS, REGIONS, SECTION_INDICES, Chunk, ChunkIndex, read_symbols
+
+
+def get_reverse_chunks(chunks):
+    reverse_chunks = sorted(
+        (Chunk(chunk.dst_start, chunk.dst_start + chunk.src_end - chunk.src_start, chunk.src_start)
+            for chunk in chunks),
+        key = lambda chunk: chunk.src_start,
+    )
+    # A few chunks overlap on the destination side, the later one wins there so that lookups stay
+    # unambiguous (see --check).
+    for chunk, next_chunk in zip(reverse_chunks, reverse_chunks[1:]):
+        chunk.src_end = min(chunk.src_end, next_chunk.src_start)
+    return [chunk for chunk in reverse_chunks if chunk.src_start < chunk.src_end]
+
+class Translator:
+    def __init__(self):
+        self.to_pal = {region: ChunkIndex(get_reverse_chunks(chunks)) for region, chunks in CHUNKS.items()}
+        self.from_pal = {region: ChunkIndex(chunks) for region, chunks in CHUNKS.items()}
+
+    def translate(self, src_region, dst_region, address):
+        if src_region == dst_region:
+            return address
+        if src_region != 'P':
+            chunk = self.to_pal[src_region].find(address)
+            if chunk is None:
+                return None
+            address = chunk.port(address)
+        if dst_region != 'P':
+            chunk = self.from_pal[dst_region].find(address)
+            if chunk is None:
+                return None
+            address = chunk.port(address)
+        return address
+
+    def translate_many(self, src_region, dst_region, addresses):
+        return [self.translate(src_region, dst_region, address) for address in addresses]
+
+class SymbolIndex:
+    def __init__(self, in_path):
+        symbols = sorted((address, name) for name, address in filter(None, read_symbols(in_path)))
+        self.addresses = [address for address, _ in symbols]
+        self.names = [name for _, name in symbols]
+
+    def find(self, address):
+        i = bisect_right(self.addresses, address) - 1
+        if i < 0:
+            return None
+        offset = address - self.addresses[i]
+        return self.names[i] if offset == 0 else f'{self.names[i]}+{offset:#x}'
+
+# Destination overlaps of a few bytes between the existing chunks, get_reverse_chunks lets the later
+# chunk win there. Only new overlaps make --check fail.
+KNOWN_DST_OVERLAPS = {
+    'E': {
+        (0x80021b08, 0x80225e74),
+        (0x80594d80, 0x8059682c),
+        (0x806066a4, 0x80606720),
+        (0x8065cd74, 0x80660694),
+        (0x806d2ddc, 0x806d8564),
+    },
+    'J': {
+        (0x8000ae2c, 0x80021acc),
+        (0x806204c8, 0x8063716c),
+    },
+    'K': {
+        (0x8017517c, 0x80175bf0),
+        (0x8060f174, 0x80625e18),
+    },
+}
+
+def get_overlaps(ranges):
+    overlaps = []
+    ranges = sorted(ranges)
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        if end > next_start:
+            overlaps += [(start, end, next_start, next_end)]
+    return overlaps
+
+def format_overlap(region, side, overlap):
+    start, end, next_start, next_end = overlap
+    return f'{region} {side}: {start:#x}-{end:#x} overlaps {next_start:#x}-{next_end:#x}'
+
+def get_gaps(region, chunks):
+    gaps = []
+    chunks = sorted(chunks, key = lambda chunk: chunk.src_start)
+    for chunk, next_chunk in zip(chunks, chunks[1:]):
+        if chunk.src_end >= next_chunk.src_start:
+            continue
+        # Only gaps within a single PAL section are reported, the sections themselves are not
+        # contiguous.
+        section, _ = SECTION_INDICES['P'].find(chunk.src_end)
+        if section is not None and next_chunk.src_start <= section.end:
+            gaps += [f'{region}: {chunk.src_end:#x}-{next_chunk.src_start:#x} in {section.name} is not ported']
+    return gaps
+
+def check_chunks(region, chunks):
+    src_overlaps = get_overlaps([(chunk.src_start, chunk.src_end) for chunk in chunks])
+    dst_overlaps = get_overlaps([
+        (chunk.dst_start, chunk.dst_start + chunk.src_end - chunk.src_start) for chunk in chunks
+    ])
+    overlaps = [format_overlap(region, 'src', overlap) for overlap in src_overlaps]
+    warnings = []
+    for start, end, next_start, next_end in dst_overlaps:
+        overlap = format_overlap(region, 'dst', (start, end, next_start, next_end))
+        if (start, next_start) in KNOWN_DST_OVERLAPS.get(region, set()):
+            warnings += [overlap]
+        else:
+            overlaps += [overlap]
+    return overlaps, warnings, get_gaps(region, chunks)
+
+def check(verbose):
+    is_valid = True
+    for region, chunks in CHUNKS.items():
+        overlaps, warnings, gaps = check_chunks(region, chunks)
+        for overlap in overlaps:
+            print(f'Overlap: {overlap}')
+        for warning in warnings:
+            print(f'Warning: {warning} (known, resolved for reverse lookups)')
+        if verbose:
+            for gap in gaps:
+                print(f'Gap: {gap}')
+        print(f'{region}: {len(chunks)} chunks, {len(overlaps)} overlaps, {len(warnings)} known overlaps, '
+              f'{len(gaps)} gaps')
+        is_valid = is_valid and not overlaps
+    return is_valid
+
+def read_addresses(in_file):
+    for line in in_file:
+        for token in line.split():
+            yield token
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('src_region', nargs='?', choices=REGIONS)
+    parser.add_argument('dst_region', nargs='?', choices=REGIONS)
+    parser.add_argument('addresses', nargs='*', help='Read from stdin if none are given')
+    parser.add_argument('--symbols', help='PAL symbol map used to name the translated addresses')
+    parser.add_argument('--check', action='store_true', help='Validate the chunk tables instead')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.verbose) else 1)
+
+    if args.src_region is None or args.dst_region is None:
+        sys.exit('A source and a destination region are required!')
+
+    translator = Translator()
+    symbols = SymbolIndex(args.symbols) if args.symbols is not None else None
+    tokens = args.addresses if args.addresses else read_addresses(sys.stdin)
+    lines = []
+    is_valid = True
+    for token in tokens:
+        try:
+            address = int(token, 16)
+        except ValueError:
+            # Keep going, so that one bad line doesn't lose the others.
+            print(f'Invalid address \'{token}\'!', file=sys.stderr)
+            is_valid = False
+            lines += [f'{token} ?' + (' ?' if symbols is not None else '') + '\n']
+            continue
+        translated = translator.translate(args.src_region, args.dst_region, address)
+        line = f'{address:#x} ' + ('?' if translated is None else f'{translated:#x}')
+        if symbols is not None:
+            pal_address = translator.translate(args.src_region, 'P', address)
+            name = symbols.find(pal_address) if pal_address is not None else None
+            line += ' ' + (name if name is not None else '?')
+        lines += [line + '\n']
+        if len(lines) >= 0x1000:
+            sys.stdout.write(''.join(lines))
+            lines = []
+    sys.stdout.write(''.join(lines))
+    sys.exit(0 if is_valid else 1)